@@ -19,5 +19,10 @@
 from __future__ import division
 from geneacrystal import main, util
 
-def play():
+def play(debugVisualisation=False, sanityChecks=False, physicsProfiling=False,
+         seed=None):
+    util.DEBUG_VISUALISATION = debugVisualisation
+    util.SANITY_CHECKS = sanityChecks
+    util.PHYSICS_PROFILING = physicsProfiling
+    util.GAME_SEED = seed
     main.Main.start(resolution=(util.WINDOW_SIZE))
\ No newline at end of file
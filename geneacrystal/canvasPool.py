@@ -0,0 +1,131 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+from __future__ import division
+from libavg import avg
+from geneacrystal import util
+import collections
+import math
+
+
+class OnDemandRenderer(object):
+    
+    def __init__(self, canvas):
+        self._canvas = canvas
+        self._canvas.autorender = False
+        self._dirty = True
+        self._renderUntil = 0
+        self.continuous = False
+        
+    def invalidate(self, duration=0):
+        self._dirty = True
+        if duration > 0:
+            self._renderUntil = max(self._renderUntil,
+                                    avg.Player.get().getFrameTime() + duration)
+            
+    def renderIfDirty(self):
+        if (self._dirty or self.continuous or
+            avg.Player.get().getFrameTime() <= self._renderUntil):
+            self._dirty = False
+            self._canvas.render()
+
+
+class CanvasPool(object):
+    
+    _instance = None
+    
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+    
+    def __init__(self, multisamplesamples=4, granularity=32):
+        self._multisamplesamples = multisamplesamples
+        self._granularity = granularity
+        self._freeCanvases = collections.defaultdict(list)
+        self._canvasSizes = dict()
+        self._canvasCounter = 0
+        
+        self._shadowCanvas = None
+        self._shadowRenderer = None
+        self._shadowImage = None
+        self._shadowFrameHandler = None
+        self._shadowLayers = 0
+        
+    def _createCanvas(self, canvasId, size, handleEvents):
+        return avg.Player.get().createCanvas(id=canvasId,
+                                             size=size,
+                                             handleevents=handleEvents,
+                                             multisamplesamples=self._multisamplesamples,
+                                             )
+        
+    def acquire(self, size):
+        size = tuple(int(math.ceil(extent / self._granularity)) * self._granularity
+                     for extent in size)
+        freeCanvases = self._freeCanvases[size]
+        if freeCanvases:
+            canvas = freeCanvases.pop()
+            canvas.autorender = True
+            return canvas
+        
+        self._canvasCounter += 1
+        canvas = self._createCanvas("pooledCanvas{}".format(self._canvasCounter),
+                                    size, True)
+        self._canvasSizes[canvas.getID()] = size
+        return canvas
+    
+    def release(self, canvas):
+        root = canvas.getRootNode()
+        while root.getNumChildren() > 0:
+            root.getChild(0).unlink(True)
+        canvas.autorender = False
+        self._freeCanvases[self._canvasSizes[canvas.getID()]].append(canvas)
+        
+    def acquireShadowLayer(self, parent, beforeNode, opacity=0.4):
+        if self._shadowCanvas is None:
+            self._shadowCanvas = self._createCanvas("sharedShadowCanvas",
+                                                    util.WINDOW_SIZE, False)
+            self._shadowRenderer = OnDemandRenderer(self._shadowCanvas)
+        if self._shadowImage is None:
+            self._shadowImage = avg.ImageNode(href="canvas:sharedShadowCanvas",
+                                              size=util.WINDOW_SIZE,
+                                              opacity=opacity)
+            parent.insertChildBefore(self._shadowImage, beforeNode)
+            self._shadowFrameHandler = avg.Player.get().setOnFrameHandler(
+                    self._shadowRenderer.renderIfDirty)
+            
+        self._shadowLayers += 1
+        layer = avg.DivNode(parent=self._shadowCanvas.getRootNode())
+        layer.pivot = (0,0)
+        self._shadowRenderer.invalidate()
+        return layer
+    
+    def releaseShadowLayer(self, layer):
+        layer.unlink(True)
+        self._shadowRenderer.invalidate()
+        self._shadowLayers -= 1
+        if self._shadowLayers == 0:
+            self._shadowImage.unlink(True)
+            self._shadowImage = None
+            avg.Player.get().clearInterval(self._shadowFrameHandler)
+            self._shadowFrameHandler = None
+            
+    def invalidateShadows(self, duration=0):
+        if self._shadowRenderer is not None:
+            self._shadowRenderer.invalidate(duration)
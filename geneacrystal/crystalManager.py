@@ -19,8 +19,8 @@
 from __future__ import division
 import collections
 import random
+import bisect
 from geneacrystal.gameElements import items, structures
-import itertools
 import inspect
 from geneacrystal import gameElements
 
@@ -46,20 +46,62 @@ if __debug__:
     print  "---------------------"    
     
 
+class AliasSampler(object):
+    """
+    Walker's alias method: draws from a weighted list in constant time
+    after a linear setup.
+    """
+    
+    def __init__(self, weightedList):
+        self._values = [value for weight, value in weightedList]
+        count = len(weightedList)
+        total = sum(weight for weight, value in weightedList)
+        scaled = [weight*count/total for weight, value in weightedList]
+        self._probabilities = [1]*count
+        self._aliases = range(count)
+        
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            lower = small.pop()
+            upper = large.pop()
+            self._probabilities[lower] = scaled[lower]
+            self._aliases[lower] = upper
+            scaled[upper] += scaled[lower] - 1
+            if scaled[upper] < 1:
+                small.append(upper)
+            else:
+                large.append(upper)
+        
+    def sample(self, randomGenerator=random):
+        index = randomGenerator.randrange(len(self._values))
+        if randomGenerator.random() < self._probabilities[index]:
+            return self._values[index]
+        return self._values[self._aliases[index]]
+    
+
 class CrystalManager(object):
       
-    def __init__(self, weights, numberOfColors = 3):
-        assert weights
-        self._weightedItems = self._makeWeightedList(weights, _itemMap)
-        self._weightedElements = self._makeWeightedList(weights, _elementMap)
+    def __init__(self, weights, numberOfColors = 3, randomGenerator=None):
+        self._random = random if randomGenerator is None else randomGenerator
         self._numberOfColors = min(numberOfColors, len(gameElements.availableColors))
         self._structures = []
-        assert len(self._weightedItems) != 0
-        assert len(self._weightedElements)  !=0
+        self.setWeights(weights)
         self._crystalLog = collections.defaultdict(lambda : 0)
+        self._colorCount = collections.Counter()
+        self._cumulativeColors = None
+        
+    def setWeights(self, weights):
+        assert weights
+        weightedItems = self._makeWeightedList(weights, _itemMap)
+        weightedElements = self._makeWeightedList(weights, _elementMap)
+        assert len(weightedItems) != 0
+        assert len(weightedElements)  !=0
+        self._itemSampler = AliasSampler(weightedItems)
+        self._elementSampler = AliasSampler(weightedElements)
         
     def getNextItemOrCrystalConstructor(self, source=None):
-            node =self._getRandomforWeightedList(self._weightedItems)
+            node =self._itemSampler.sample(self._random)
             self._crystalLog[node.itemType] +=1
             if node.color == None:
                 color = None
@@ -81,39 +123,44 @@ class CrystalManager(object):
             if key in classes:
                 result.append((weights[key], classes[key]))
         return result
-                  
-    def _getRandomforWeightedList(self, weightedlist):
-        return random.choice(list(itertools.chain(*[itertools.repeat(element, weight) for weight, element in weightedlist])))
     
     def _getRandomWeightedStructureElementOrItem(self):
-        element = self._getRandomforWeightedList(self._weightedElements)
+        element = self._elementSampler.sample(self._random)
         return element   
     
     def _getRandomColor(self, weighted=False):
         
         if weighted:
-            colorDistribution = self._getColorDistribution()
-            rand = random.uniform(0,1)
-            
-            intervall = 0
-            for color, value in colorDistribution.items():
-                intervall += value
-                if intervall >= rand:
-                    return color
+            colors, cumulativeCounts = self._getCumulativeColorDistribution()
+            if colors:
+                rand = self._random.uniform(0, cumulativeCounts[-1])
+                return colors[bisect.bisect_left(cumulativeCounts, rand)]
         
-        return random.choice(gameElements.availableColors[:self._numberOfColors])
+        return self._random.choice(gameElements.availableColors[:self._numberOfColors])
 
-    def _getColorDistribution(self):
-        overallCount = collections.Counter()
-        for structure in self._structures:
-            overallCount += structure.getColorCount()
-        del overallCount[None]
-        #normalize
-        overallSum = sum(overallCount.values())
-        return {key:(value/overallSum) for key,value in overallCount.items()}
+    def _getCumulativeColorDistribution(self):
+        if self._cumulativeColors is None:
+            colors = list(self._colorCount)
+            cumulativeCounts = []
+            total = 0
+            for color in colors:
+                total += self._colorCount[color]
+                cumulativeCounts.append(total)
+            self._cumulativeColors = colors, cumulativeCounts
+        return self._cumulativeColors
+    
+    def changeColorCount(self, color, delta):
+        self._colorCount[color] += delta
+        if self._colorCount[color] <= 0:
+            del self._colorCount[color]
+        self._cumulativeColors = None
 
     def registerStructure(self, structure):
         self._structures.append(structure)
+        for color, count in structure.getColorCount().items():
+            self.changeColorCount(color, count)
         
     def removeStructure(self, structure):
         self._structures.remove(structure)
+        for color, count in structure.getColorCount().items():
+            self.changeColorCount(color, -count)
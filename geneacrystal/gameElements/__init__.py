@@ -20,6 +20,7 @@ from geneacrystal import themes, util, physic
 import libavg as avg
 import pymunk
 from geneacrystal.helpSystem import AnnotatedObject
+from geneacrystal.orderedSet import OrderedSet
 import threading
 
 
@@ -53,7 +54,7 @@ class GameElementBase(AnnotatedObject):
         self._rootParent = parent
         self._hidden = False
         self._hideLock = threading.Lock()
-        self._shapes = []
+        self._shapes = OrderedSet()
         self._body = None
         self._initPhysic(position, angle)        
         assert(self._body is not None)
@@ -66,7 +67,7 @@ class GameElementBase(AnnotatedObject):
             self._interactionDiv.pos = util.vectorMult(self.size, -0.5)
             self._interactionDiv.size = self.size
             self._setInfoHandler(self._interactionDiv)
-            if __debug__:
+            if util.DEBUG_VISUALISATION:
                 self._interactionDiv.elementoutlinecolor = "FFFFFF"
         else:
             avg.Logger.get().trace(avg.Logger.WARNING, 
@@ -174,9 +175,9 @@ class GameElementBase(AnnotatedObject):
         self._root = None
         self._interactionDiv = None
         
-    def _physicUpdate(self):
-        self._setPosition(self._body.position)
-        self.angle = self._body.angle
+    def _physicUpdate(self, position, angle):
+        self._root.pos = self._root.getParent().getRelPos(tuple(position))
+        self._root.angle = angle
         
     def _addShape(self, shape):
         if self._space.inStep:
@@ -184,7 +185,7 @@ class GameElementBase(AnnotatedObject):
         else:
             self._space.add(shape)
       
-        self._shapes.append(shape)
+        self._shapes.add(shape)
         
     def _removeShape(self, shape):
         if self._space.inStep:
@@ -21,6 +21,8 @@ import pymunk
 from geneacrystal.gameElements import GameElementBase, structures
 from libavg import avg, ui
 from geneacrystal.util import pointValues
+from geneacrystal.tweenEngine import TweenEngine
+import logging
 
 
 class Item(GameElementBase):
@@ -81,8 +83,7 @@ class Item(GameElementBase):
     def _takeOwner(self, other):
         if other.owner is not None:
             self._owner = other.owner      
-            if __debug__:
-                print "Took Owner", self, ":", self._owner 
+            logging.debug("%s took owner %s", self, self._owner)
         
     def onTouchPointCollision(self, touchPoint): 
         self._takeOwner(touchPoint)
@@ -113,25 +114,25 @@ class Item(GameElementBase):
    
         util.centerNodeOnPosition(scoreNode,  self.position)
    
-        anim = avg.LinearAnim(scoreNode, "pos",
-                              animTime,
-                              scoreNode.pos, self.owner.pos,
-                              False, None, lambda:scoreNode.unlink(True))
+        tweens = TweenEngine.get()
+        tweens.tween(scoreNode, "pos",
+                     animTime,
+                     scoreNode.pos, self.owner.pos,
+                     unlink=True)
         player = self.owner
         def addPoints():
             player.score+=points
             
-        textShrinkAnim = avg.LinearAnim(scoreNode, "fontsize",
-                              int(animTime*0.6),
-                              maxTextSize, maxTextSize*0.2,
-                              False, None, addPoints )
+        def shrinkText():
+            tweens.tween(scoreNode, "fontsize",
+                         int(animTime*0.6),
+                         maxTextSize, maxTextSize*0.2,
+                         addPoints)
         
-        textGrowAnim = avg.LinearAnim(scoreNode, "fontsize",
-                              int(animTime*0.4),
-                              maxTextSize*0.1, maxTextSize,
-                              False, None, textShrinkAnim.start)
-        textGrowAnim.start()
-        anim.start()
+        tweens.tween(scoreNode, "fontsize",
+                     int(animTime*0.4),
+                     maxTextSize*0.1, maxTextSize,
+                     shrinkText)
         
 
 class ColoredCrystal(Item):
@@ -0,0 +1,141 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+from __future__ import division
+from libavg import avg
+import math
+
+
+class MeshBatch(object):
+    
+    circleSegments = 16
+    
+    class Part(object):
+        
+        def __init__(self, node):
+            self.node = node
+            self.keys = set()
+    
+    def __init__(self, parent, color, changeCallback=None):
+        self._parent = parent
+        self._color = color
+        self._changeCallback = changeCallback
+        
+        self._geometry = dict()
+        self._parts = dict()
+        self._mainPart = self._createPart(1)
+        self._pendingFades = dict()
+        self._dirtyParts = set()
+        
+    def _createPart(self, opacity):
+        node = avg.MeshNode(parent=self._parent, color=self._color, opacity=opacity)
+        node.active = False
+        return MeshBatch.Part(node)
+    
+    def addLine(self, key, pos1, pos2, width, fadeDuration=0):
+        (x1, y1), (x2, y2) = pos1, pos2
+        length = math.hypot(x2 - x1, y2 - y1)
+        if length > 0:
+            normalX = (y1 - y2) / length * width / 2
+            normalY = (x2 - x1) / length * width / 2
+        else:
+            normalX = normalY = 0
+        vertices = [(x1 + normalX, y1 + normalY), (x1 - normalX, y1 - normalY),
+                    (x2 + normalX, y2 + normalY), (x2 - normalX, y2 - normalY)]
+        self._add(key, vertices, [(0, 1, 2), (1, 3, 2)], fadeDuration)
+        
+    def addCircle(self, key, center, radius, fadeDuration=0):
+        centerX, centerY = center
+        vertices = [(centerX, centerY)]
+        for i in range(self.circleSegments):
+            angle = 2 * math.pi * i / self.circleSegments
+            vertices.append((centerX + radius * math.cos(angle),
+                             centerY + radius * math.sin(angle)))
+        triangles = [(0, i + 1, (i + 1) % self.circleSegments + 1)
+                     for i in range(self.circleSegments)]
+        self._add(key, vertices, triangles, fadeDuration)
+        
+    def _add(self, key, vertices, triangles, fadeDuration):
+        self.remove(key)
+        if fadeDuration > 0:
+            part = self._pendingFades.get(fadeDuration)
+            if part is None:
+                part = self._createPart(0)
+                self._pendingFades[fadeDuration] = part
+        else:
+            part = self._mainPart
+        self._geometry[key] = vertices, triangles
+        self._parts[key] = part
+        part.keys.add(key)
+        self._dirtyParts.add(part)
+        
+    def remove(self, key):
+        part = self._parts.pop(key, None)
+        if part is not None:
+            del self._geometry[key]
+            part.keys.discard(key)
+            self._dirtyParts.add(part)
+            
+    def update(self):
+        for fadeDuration, part in self._pendingFades.iteritems():
+            avg.LinearAnim(part.node, "opacity", fadeDuration, 0, 1, False, None,
+                           lambda part=part: self._mergeFade(part)).start()
+        self._pendingFades.clear()
+        
+        if not self._dirtyParts:
+            return
+        for part in self._dirtyParts:
+            self._rebuild(part)
+        self._dirtyParts.clear()
+        if self._changeCallback is not None:
+            self._changeCallback()
+            
+    def _mergeFade(self, part):
+        if self._mainPart is None:
+            return
+        for key in part.keys:
+            self._parts[key] = self._mainPart
+        self._mainPart.keys.update(part.keys)
+        self._dirtyParts.add(self._mainPart)
+        self._dirtyParts.discard(part)
+        part.node.unlink(True)
+        self.update()
+        
+    def _rebuild(self, part):
+        vertexCoords = []
+        triangles = []
+        for key in part.keys:
+            vertices, keyTriangles = self._geometry[key]
+            offset = len(vertexCoords)
+            vertexCoords.extend(vertices)
+            triangles.extend((a + offset, b + offset, c + offset) for a, b, c in keyTriangles)
+        part.node.vertexcoords = vertexCoords
+        part.node.texcoords = [(0, 0)] * len(vertexCoords)
+        part.node.triangles = triangles
+        part.node.active = bool(triangles)
+        
+    def delete(self):
+        parts = set(self._parts.values()) | set(self._pendingFades.values())
+        parts.add(self._mainPart)
+        for part in parts:
+            part.node.unlink(True)
+        self._mainPart = None
+        self._parts = None
+        self._geometry = None
+        self._pendingFades = None
+        self._dirtyParts = None
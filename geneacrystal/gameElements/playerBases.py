@@ -31,6 +31,9 @@ class PlayerBase(GameElementBase):
         self._crystalGenerator = crystalGenerator
         self._maxHitPoints = hitPoints
         self._hitPoints = self._maxHitPoints
+        self._launcherItems = set()
+        self._spawnEnabled = False
+        self._spawnTimer = None
         
         GameElementBase.__init__(self, *args, **kwargs)
         
@@ -97,7 +100,8 @@ class PlayerBase(GameElementBase):
         raise NotImplementedError
     
     def _getCreateCrystalIfEmpty(self):
-        if self.getItemOnLauncher() is not None:
+        self._spawnTimer = None
+        if not self.alive or self.getItemOnLauncher() is not None:
             return
         self._resetTimeout()
         
@@ -119,30 +123,32 @@ class PlayerBase(GameElementBase):
                                  )
         crystal.rotationSpeed = 2
         crystal.rotatioNenabled = True
+        self._launcherItems.add(crystal)
         
     def getItemOnLauncher(self):
-        shape = self.getShapesOnLauncher()
-        if shape is None or not isinstance(shape.body.gameElement, items.Item):
-            return None
-        else:
-            crystal = shape.body.gameElement
-            return crystal    
-        
-    def getShapesOnLauncher(self):
-        intersectionShapes = self._space.shape_query(self._sensorShape)
-        intersectionShapes = filter(lambda shape: isinstance(shape.body,physic.BaseBody),
-                                    intersectionShapes)
-        intersectionCircles = filter(lambda shape: isinstance(shape.body.gameElement,
-                                                              items.Item),
-                                     intersectionShapes)
-
-        if len(intersectionCircles) == 0:
-            return None
-        else:
-            return intersectionCircles[0]
+        self._launcherItems = set(item for item in self._launcherItems if item.alive)
+        for item in self._launcherItems:
+            return item
+        return None
+    
+    def onLauncherEnter(self, other):
+        if isinstance(other, items.Item):
+            self._launcherItems.add(other)
+        return True
+    
+    # The occupancy set relies on the sensor's separate callback, which
+    # Chipmunk also fires when a touching shape is removed from the space
+    # (see tests/test_physic.py). A crystal destroyed on the launcher has a
+    # dead game element by then (other is None), so getItemOnLauncher
+    # prunes it by its alive flag.
+    def onLauncherLeave(self, other):
+        self._launcherItems.discard(other)
+        if self._spawnEnabled and self.getItemOnLauncher() is None:
+            self._scheduleCrystalSpawn()
+        return True
         
     def _initPhysic(self, position, angle):        
-        self._body = physic.BaseBody(self, None,None)
+        self._body = physic.StaticBody(self)
         self._body.position = position
         self._body.angle = angle
         points = [(0,0), (self.size[0],0), self.size, (0,self.size[1])]
@@ -156,6 +162,7 @@ class PlayerBase(GameElementBase):
         sensorPoints = map(lambda p: util.vectorMult(p, 0.9), points)
         self._sensorShape = pymunk.Poly(self._body, sensorPoints)
         self._sensorShape.sensor = True
+        self._sensorShape.collision_type = physic.LauncherSensorCollisionType
         self._addShape(self._sensorShape)
         
         self._addLaunchAreaDivider()
@@ -264,11 +271,19 @@ class PlayerBase(GameElementBase):
         self.delete()
         
     def stopCrystalSpawn(self):
-        avg.Player.get().clearInterval(self._spawnTimer)
+        self._spawnEnabled = False
+        if self._spawnTimer is not None:
+            avg.Player.get().clearInterval(self._spawnTimer)
+            self._spawnTimer = None
         
     def startCrystalSpawn(self):
-        player = avg.Player.get()
-        self._spawnTimer = player.setInterval(500, self._getCreateCrystalIfEmpty)
+        self._spawnEnabled = True
+        self._scheduleCrystalSpawn()
+        
+    def _scheduleCrystalSpawn(self):
+        if self._spawnTimer is None:
+            player = avg.Player.get()
+            self._spawnTimer = player.setTimeout(0, self._getCreateCrystalIfEmpty)
         
     def _makeInfoElements(self):
         minSize = min(self._parent.size)*0.85
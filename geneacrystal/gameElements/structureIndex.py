@@ -0,0 +1,450 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+import collections
+import math
+
+
+class DisjointSet(object):
+    """
+    Union-find over hashable items. Every root knows the members of its set,
+    so a set can be listed in O(set size) and split again after a removal.
+    """
+
+    def __init__(self):
+        self._parent = {}
+        self._members = {}
+
+    def __contains__(self, item):
+        return item in self._parent
+
+    def add(self, item):
+        self._parent[item] = item
+        self._members[item] = set([item])
+
+    def find(self, item):
+        root = item
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[item] != root:
+            self._parent[item], item = root, self._parent[item]
+        return root
+
+    def union(self, itemA, itemB):
+        rootA = self.find(itemA)
+        rootB = self.find(itemB)
+        if rootA == rootB:
+            return
+        if len(self._members[rootA]) < len(self._members[rootB]):
+            rootA, rootB = rootB, rootA
+        self._parent[rootB] = rootA
+        self._members[rootA] |= self._members.pop(rootB)
+
+    def members(self, item):
+        return self._members[self.find(item)]
+
+    def split(self, item, neighbors):
+        """
+        Removes item and regroups the rest of its set along the connections
+        reported by neighbors. Only the affected set is visited.
+        """
+        remaining = self._members.pop(self.find(item))
+        remaining.discard(item)
+        del self._parent[item]
+
+        while remaining:
+            root = remaining.pop()
+            component = set([root])
+            self._parent[root] = root
+            stack = [root]
+            while stack:
+                for neighbor in neighbors(stack.pop()):
+                    if neighbor in remaining:
+                        remaining.discard(neighbor)
+                        component.add(neighbor)
+                        self._parent[neighbor] = root
+                        stack.append(neighbor)
+            self._members[root] = component
+
+
+class ClusterIndex(object):
+    """
+    Keeps the same type clusters of a structure graph up to date. Elements of
+    the wildcard type belong to the clusters of every type.
+    """
+
+    wildcardType = "All"
+    untypedType = "None"
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._types = {}
+        self._sets = {}
+        self._wildcards = set()
+
+    def _getSet(self, elementType):
+        if elementType not in self._sets:
+            disjointSet = DisjointSet()
+            for wildcard in self._wildcards:
+                disjointSet.add(wildcard)
+            for wildcard in self._wildcards:
+                for neighbor in self._graph.neighbors_iter(wildcard):
+                    if neighbor in self._wildcards:
+                        disjointSet.union(wildcard, neighbor)
+            self._sets[elementType] = disjointSet
+        return self._sets[elementType]
+
+    def _getSetsFor(self, nodeId):
+        elementType = self._types[nodeId]
+        if elementType == self.wildcardType:
+            return self._sets.values()
+        elif elementType == self.untypedType:
+            return []
+        else:
+            return [self._sets[elementType]]
+
+    def addNode(self, nodeId, elementType):
+        self._types[nodeId] = elementType
+        if elementType == self.wildcardType:
+            self._getSet(self.wildcardType)
+            self._wildcards.add(nodeId)
+            for disjointSet in self._sets.values():
+                disjointSet.add(nodeId)
+        elif elementType != self.untypedType:
+            self._getSet(elementType).add(nodeId)
+
+    def addEdge(self, nodeIdA, nodeIdB):
+        for disjointSet in self._getSetsFor(nodeIdA):
+            if nodeIdB in disjointSet:
+                disjointSet.union(nodeIdA, nodeIdB)
+
+    def removeNode(self, nodeId):
+        if nodeId not in self._types:
+            return
+        neighbors = lambda otherId: self._graph.neighbors_iter(otherId)
+        for disjointSet in self._getSetsFor(nodeId):
+            disjointSet.split(nodeId, neighbors)
+        self._wildcards.discard(nodeId)
+        del self._types[nodeId]
+
+    def getCluster(self, nodeId):
+        if nodeId not in self._types:
+            return set()
+        elementType = self._types[nodeId]
+        if elementType == self.untypedType:
+            return set()
+        return set(self._sets[elementType].members(nodeId))
+
+
+class ReachabilityIndex(object):
+    """
+    Spanning forest of a structure graph rooted at its fixed elements. Nodes
+    that lose their connection to every root are kept as detached, so the
+    unreachable part of the graph is known without rescanning it.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._roots = set()
+        self._parent = {}
+        self._children = {}
+        self._detached = set()
+
+    def getDetached(self):
+        return set(self._detached)
+
+    def addNode(self, nodeId):
+        self._detached.add(nodeId)
+
+    def addEdge(self, nodeIdA, nodeIdB):
+        if nodeIdA in self._parent and nodeIdB in self._detached:
+            self._attach(nodeIdB, nodeIdA)
+        elif nodeIdB in self._parent and nodeIdA in self._detached:
+            self._attach(nodeIdA, nodeIdB)
+
+    def removeNode(self, nodeId):
+        self._roots.discard(nodeId)
+        if nodeId in self._detached:
+            self._detached.remove(nodeId)
+        elif nodeId in self._parent:
+            orphans = self._detachSubtree(nodeId)
+            self._detached.remove(nodeId)
+            orphans.remove(nodeId)
+            self._reattach(orphans)
+
+    def setRoot(self, nodeId):
+        self._roots.add(nodeId)
+        if nodeId in self._parent:
+            self._setParent(nodeId, None)
+        elif nodeId in self._detached:
+            self._attach(nodeId, None)
+
+    def unsetRoot(self, nodeId):
+        if nodeId not in self._roots:
+            return
+        self._roots.remove(nodeId)
+        if nodeId in self._parent:
+            self._reattach(self._detachSubtree(nodeId))
+
+    def _setParent(self, nodeId, parentId):
+        oldParent = self._parent.get(nodeId)
+        if oldParent is not None:
+            self._children[oldParent].discard(nodeId)
+        self._parent[nodeId] = parentId
+        if parentId is not None:
+            self._children[parentId].add(nodeId)
+
+    def _attach(self, nodeId, parentId):
+        self._detached.remove(nodeId)
+        self._children[nodeId] = set()
+        self._setParent(nodeId, parentId)
+        queue = [nodeId]
+        while queue:
+            current = queue.pop()
+            for neighbor in self._graph.neighbors_iter(current):
+                if neighbor in self._detached:
+                    self._detached.remove(neighbor)
+                    self._children[neighbor] = set()
+                    self._setParent(neighbor, current)
+                    queue.append(neighbor)
+
+    def _detachSubtree(self, nodeId):
+        self._setParent(nodeId, None)
+        subtree = set()
+        stack = [nodeId]
+        while stack:
+            current = stack.pop()
+            subtree.add(current)
+            stack.extend(self._children.pop(current))
+            del self._parent[current]
+        self._detached |= subtree
+        return subtree
+
+    def _reattach(self, orphans):
+        for orphan in orphans:
+            if orphan not in self._detached:
+                continue
+            if orphan in self._roots:
+                self._attach(orphan, None)
+                continue
+            for neighbor in self._graph.neighbors_iter(orphan):
+                if neighbor in self._parent:
+                    self._attach(orphan, neighbor)
+                    break
+
+
+class ShortestPathTree(object):
+    """
+    Breadth first search tree grown from all sources at once. It is rebuilt
+    lazily after the graph changed, so looking up the shortest path from the
+    nearest source is a walk along the stored parents.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._sources = set()
+        self._parent = None
+
+    def addSource(self, nodeId):
+        self._sources.add(nodeId)
+        self.invalidate()
+
+    def removeSource(self, nodeId):
+        self._sources.discard(nodeId)
+        self.invalidate()
+
+    def invalidate(self):
+        self._parent = None
+
+    def _build(self):
+        self._parent = {}
+        queue = collections.deque()
+        for source in self._sources:
+            if source in self._graph:
+                self._parent[source] = None
+                queue.append(source)
+        while queue:
+            current = queue.popleft()
+            for neighbor in self._graph.neighbors_iter(current):
+                if neighbor not in self._parent:
+                    self._parent[neighbor] = current
+                    queue.append(neighbor)
+
+    def getPath(self, nodeId):
+        if self._parent is None:
+            self._build()
+        if nodeId not in self._parent:
+            return None
+        path = []
+        while nodeId is not None:
+            path.append(nodeId)
+            nodeId = self._parent[nodeId]
+        path.reverse()
+        return path
+
+
+class SlotLattice(object):
+    """
+    Hexagonal lattice of growth slots in structure local coordinates. Every
+    slot counts the circles blocking it and knows the circles close enough to
+    be its neighbors.
+    """
+
+    def __init__(self, spacing, slotRadius, reach):
+        self._spacing = spacing
+        self._rowHeight = spacing * math.sqrt(3) / 2
+        self._slotRadius = slotRadius
+        self._reach = reach
+        self._circles = {}
+        self._blockers = collections.Counter()
+        self._neighbors = collections.defaultdict(set)
+
+    def getSlotPosition(self, slot):
+        q, r = slot
+        return (q + r / 2.0) * self._spacing, r * self._rowHeight
+
+    def _getSlotsInRange(self, position, distance):
+        x, y = position
+        rMin = int(math.floor((y - distance) / self._rowHeight))
+        rMax = int(math.ceil((y + distance) / self._rowHeight))
+        for r in range(rMin, rMax + 1):
+            qMin = int(math.floor((x - distance) / self._spacing - r / 2.0))
+            qMax = int(math.ceil((x + distance) / self._spacing - r / 2.0))
+            for q in range(qMin, qMax + 1):
+                slotX, slotY = self.getSlotPosition((q, r))
+                if (slotX - x) ** 2 + (slotY - y) ** 2 < distance ** 2:
+                    yield q, r
+
+    def _isFree(self, slot):
+        return slot in self._neighbors and slot not in self._blockers
+
+    def addCircle(self, key, position, radius):
+        blocked = list(self._getSlotsInRange(position, radius + self._slotRadius))
+        near = list(self._getSlotsInRange(position, radius + self._reach))
+        self._circles[key] = blocked, near
+        for slot in blocked:
+            self._blockers[slot] += 1
+        for slot in near:
+            self._neighbors[slot].add(key)
+
+    def removeCircle(self, key):
+        blocked, near = self._circles.pop(key)
+        for slot in blocked:
+            self._blockers[slot] -= 1
+            if self._blockers[slot] == 0:
+                del self._blockers[slot]
+        for slot in near:
+            self._neighbors[slot].remove(key)
+            if not self._neighbors[slot]:
+                del self._neighbors[slot]
+
+    def rekeyCircle(self, oldKey, newKey):
+        self._circles[newKey] = self._circles.pop(oldKey)
+        for slot in self._circles[newKey][1]:
+            self._neighbors[slot].remove(oldKey)
+            self._neighbors[slot].add(newKey)
+
+    def getKeysNear(self, slot):
+        return set(self._neighbors.get(slot, ()))
+
+    def getFreeSlotsAround(self, key):
+        """
+        Returns the free slots next to the given circle that have the most
+        neighbors.
+        """
+        best = []
+        maxNeighbors = 0
+        for slot in self._circles[key][1]:
+            if not self._isFree(slot):
+                continue
+            neighborCount = len(self._neighbors[slot])
+            if neighborCount > maxNeighbors:
+                maxNeighbors = neighborCount
+                best = [slot]
+            elif neighborCount == maxNeighbors:
+                best.append(slot)
+        return best
+
+
+class ElementRegistry(object):
+    """
+    Maps ids, shapes and libavg nodes to the elements of a structure and
+    keeps a running count of the element colors. Every change of the count
+    is reported to colorCallback.
+    """
+
+    def __init__(self, colorCallback=None):
+        self._colorCallback = colorCallback
+        self._elements = {}
+        self._shapeIds = {}
+        self._nodeIds = {}
+        self._registered = {}
+        self._colorCount = collections.Counter()
+
+    def __contains__(self, key):
+        return (key in self._elements or key in self._shapeIds
+                or key in self._nodeIds)
+
+    def __len__(self):
+        return len(self._elements)
+
+    def values(self):
+        return self._elements.values()
+
+    def get(self, key):
+        if key in self._elements:
+            return self._elements[key]
+        elif key in self._shapeIds:
+            return self._elements[self._shapeIds[key]]
+        else:
+            return self._elements[self._nodeIds[key]]
+
+    def _unmap(self, elementId):
+        shape, node = self._registered[elementId]
+        if self._shapeIds.get(shape) == elementId:
+            del self._shapeIds[shape]
+        if self._nodeIds.get(node) == elementId:
+            del self._nodeIds[node]
+
+    def update(self, element):
+        if element.id in self._registered:
+            self._unmap(element.id)
+        else:
+            self._elements[element.id] = element
+            if element.color is not None:
+                self._changeColorCount(element.color, 1)
+        self._registered[element.id] = element.shape, element.node
+        self._shapeIds[element.shape] = element.id
+        self._nodeIds[element.node] = element.id
+
+    def remove(self, element):
+        self._unmap(element.id)
+        del self._registered[element.id]
+        del self._elements[element.id]
+        if element.color is not None:
+            self._changeColorCount(element.color, -1)
+
+    def _changeColorCount(self, color, delta):
+        self._colorCount[color] += delta
+        if self._colorCount[color] == 0:
+            del self._colorCount[color]
+        if self._colorCallback is not None:
+            self._colorCallback(color, delta)
+
+    def getColorCount(self):
+        return collections.Counter(self._colorCount)
@@ -26,9 +26,13 @@ import itertools
 import random
 import math
 from geneacrystal.gameElements import GameElementBase
+from geneacrystal.gameElements.structureIndex import ClusterIndex,\
+    ReachabilityIndex, ShortestPathTree, SlotLattice, ElementRegistry
 from geneacrystal.helpSystem import AnnotatedObject
+from geneacrystal.canvasPool import CanvasPool, OnDemandRenderer
+from geneacrystal.gameElements.meshBatch import MeshBatch
+from geneacrystal.tweenEngine import TweenEngine
 import logging
-import collections
 
 
 class StructureElement(AnnotatedObject):
@@ -155,6 +159,7 @@ class EaterElement(ColoredElement):
         elif self._eatCount == self.maxEatCount:
             other.delete()
             self.node.removeLayer(-1)
+            self.parent.invalidate()
             self._eatCount += 1
 
 
@@ -208,6 +213,14 @@ class BaseStructure(GameElementBase):
     neighbourhoodThreshold = 2
     REACTION_THRESHOLD = util.REACTION_THRESHOLD
 
+    class PlannedElement(object):
+        
+        def __init__(self, slot, position, color, elementType):
+            self.slot = slot
+            self.position = position
+            self.color = color
+            self.elementType = elementType
+            
     class Veil(object):
     
         def __init__(self, structure, time, stopCallback=None, fadeOutTime = 120.0, fadeInTime=120.0):
@@ -222,6 +235,9 @@ class BaseStructure(GameElementBase):
             
             self._stopCallback = stopCallback
             
+            self._fxNode = None
+            self._veilValue = None
+            
             self._action = self._veiling
             
         def onTick(self):
@@ -258,28 +274,45 @@ class BaseStructure(GameElementBase):
             self._action = None
         
         def _setVeil(self, value):
-            fxNode = avg.HueSatFXNode(0, 100*value-100, 100*value-100, False)
-            self._structure._image.setEffect(fxNode)
+            if value == self._veilValue:
+                return
+            self._veilValue = value
+            
+            if self._fxNode is None:
+                self._fxNode = avg.HueSatFXNode(0, 100*value-100, 100*value-100, False)
+                self._structure._image.setEffect(self._fxNode)
+            else:
+                self._fxNode.saturation = 100*value-100
+                self._fxNode.lightness = 100*value-100
                 
         def _removeVeil(self):
             self._structure._image.setEffect(None)
+            self._fxNode = None
+            self._veilValue = None
             
        
             
     def __init__(self,crystalManager=None, framesToGrowth=None, startCrystals=20,
-                 *args, **kwargs):
+                 randomGenerator=None, *args, **kwargs):
         GameElementBase.__init__(self, *args, **kwargs)
         
+        self._random = random if randomGenerator is None else randomGenerator
+        
         if self.owner is not None:
             self.owner.addStructure(self)
         
         self._graph = nx.Graph()
-        self._elementMapping = {}
+        self._clusterIndex = ClusterIndex(self._graph)
+        self._reachabilityIndex = ReachabilityIndex(self._graph)
+        self._pathTree = ShortestPathTree(self._graph)
+        self._slots = SlotLattice(StructureElement.shapeOverflowFactor*util.CRYSTAL_RADIUS + util.CRYSTAL_RADIUS + 1,
+                                  util.CRYSTAL_SIZE/2,
+                                  (util.CRYSTAL_SIZE/2)*self.neighbourhoodThreshold)
+        self._elements = ElementRegistry(self._onColorCountChange)
                    
         self._fixElements = WeakSet()
         
-        if __debug__:
-            print "FRAMESTO GROWTH", framesToGrowth
+        logging.debug("Frames to growth: %s", framesToGrowth)
         self.framesToGrowth = framesToGrowth
         self.growTimer = 0
         
@@ -289,6 +322,7 @@ class BaseStructure(GameElementBase):
         self._veil = None
         
         self._growLock = False
+        self._growGroup = (self, "grow")
         self._depletedCallback = None
         self._gameOverCallback = None
     
@@ -305,49 +339,65 @@ class BaseStructure(GameElementBase):
         else:
             self._shadowColor = self.owner.color
             
-        player = avg.Player.get() 
-        self._canvas = player.createCanvas(id=str(id(self)),
-                                           size=(max(util.WINDOW_SIZE),max(util.WINDOW_SIZE)),
-                                           handleevents=True,
-                                           multisamplesamples=4,
-                                           )
-        
-        self._blackCanvas = player.createCanvas(id=str(id(self))+"Black",
-                                           size=(max(util.WINDOW_SIZE),max(util.WINDOW_SIZE)),
-                                           handleevents=True,
-                                           multisamplesamples=4,
-                                           )
-        
+        canvasPool = CanvasPool.get()
+        minX, minY, maxX, maxY = self._getCanvasRect()
+        self._canvas = canvasPool.acquire((maxX - minX, maxY - minY))
+        self._canvasRenderer = OnDemandRenderer(self._canvas)
         self._canvasRoot = self._canvas.getRootNode()
+        self._canvasOrigin = minX, minY
         
-        self._blackBackground = self._blackCanvas.getRootNode()
-        self._shadowImage = avg.ImageNode(href="canvas:{}Black".format(id(self)),
-                      parent=self._root,
-                      size=(max(util.WINDOW_SIZE),max(util.WINDOW_SIZE)),
-                      opacity=0.4)
-        util.centerNodeOnPosition(self._shadowImage, (0,0))
+        self._blackBackground = canvasPool.acquireShadowLayer(self._root.getParent(),
+                                                              self._root)
+        self._blackBackground.pos = self._root.pos
+        self._blackBackground.angle = self._root.angle
         self._graphVisRoot = avg.DivNode(parent=self._canvasRoot)
                 
-        self._image = avg.ImageNode(href="canvas:{}".format(id(self)),
+        self._image = avg.ImageNode(href="canvas:{}".format(self._canvas.getID()),
                       parent=self._root,
-                      size=(max(util.WINDOW_SIZE),max(util.WINDOW_SIZE)))
-        util.centerNodeOnPosition(self._image, (0,0))
-        self._edgeNodes = dict()
-        self._shadowNodes = dict()
+                      pos=self._canvasOrigin,
+                      size=self._canvasRoot.size)
+        self._edgeBatch = MeshBatch(self._graphVisRoot, "F88017", self.invalidate)
+        self._shadowBatch = MeshBatch(self._blackBackground, self._shadowColor,
+                                      canvasPool.invalidateShadows)
         
         self._initStructureCore()
         
         assert(self.checkSanity())
         
-        while len(self._graph) < startCrystals:
-            self.growSimple()
+        self.growInBulk(startCrystals - len(self._graph))
         
         self.rotationEnabled = True
         self._tickTimer = None
         self._startTickTimer()  
      
+    def _getCanvasRect(self):
+        x, y = self.position
+        width, height = util.WINDOW_SIZE
+        if self.rotationSpeed == 0 and self.angle == 0:
+            return -x, -y, width - x, height - y
+        
+        # Whether rotation is enabled, halted by toggleRotations or slow,
+        # crystals can grow until they touch the window border at any angle,
+        # so the canvas has to reach the farthest window corner.
+        radius = max(math.hypot(cornerX - x, cornerY - y)
+                     for cornerX in (0, width) for cornerY in (0, height))
+        radius += util.CRYSTAL_SIZE
+        return -radius, -radius, radius, radius
+    
+    def _physicUpdate(self, position, angle):
+        GameElementBase._physicUpdate(self, position, angle)
+        self._blackBackground.pos = self._root.pos
+        self._blackBackground.angle = angle
+        CanvasPool.get().invalidateShadows()
+        
+    def invalidate(self, duration=0):
+        self._canvasRenderer.invalidate(duration)
+     
     def getOffscreenPosForElement(self, pos):
-        return util.vectorAdd(pos, util.vectorMult(self._canvasRoot.size, 0.5))
+        return util.vectorSub(pos, self._canvasOrigin)
+    
+    def getShadowPosForElement(self, pos):
+        return tuple(pos)
         
     def getElementNodeParent(self):
         return self._canvasRoot
@@ -369,54 +419,52 @@ class BaseStructure(GameElementBase):
             return
         
         self._stopTickTimer()
+        
+        tweens = TweenEngine.get()
+        tweens.cancel(self)
+        tweens.cancel(self._growGroup)
 
         if self.owner is not None:
             self.owner.removeStructure(self)
+            
+        self.crystalManager.removeStructure(self)
+        self.crystalManager = None
         
-        for element in self._elementMapping.values():
+        for element in self._elements.values():
             if element.node is not None:
                 element.node.unlink(True)
                 element.node = None
             
-        self._elementMapping = None
+        self._elements = None
         
-        for node in self._edgeNodes.values():
-            node.unlink(True)
-        
-        for node in self._shadowNodes.values():
-            node.unlink(True)
-            
-        self._edgeNodes = None
-        self._shadowNodes = None
+        self._edgeBatch.delete()
+        self._shadowBatch.delete()
+        self._edgeBatch = None
+        self._shadowBatch = None
          
         self._rootParent = None
         
-        self._canvasRoot.unlink(True)
-        self._canvasRoot = None
-        
-        self._shadowImage.unlink(True)
-        self._shadowImage = None
-       
         self._graphVisRoot.unlink(True)       
         self._graphVisRoot= None
         
         self._image.unlink(True)
         self._image = None
         
-        player = avg.Player.get()
-        player.deleteCanvas(self._blackCanvas.getID())
-        player.deleteCanvas(self._canvas.getID())
+        canvasPool = CanvasPool.get()
+        canvasPool.releaseShadowLayer(self._blackBackground)
+        canvasPool.release(self._canvas)
         
-        self._blackCanvas = None
+        self._blackBackground = None
+        self._canvasRenderer = None
+        self._canvasRoot = None
         self._canvas = None
        
         
         self._fixElements = None
-        
-        
-        
-        self.crystalManager.removeStructure(self)
-        self.crystalManager = None
+        self._clusterIndex = None
+        self._reachabilityIndex = None
+        self._pathTree = None
+        self._slots = None
         
         GameElementBase.delete(self)
         
@@ -425,12 +473,51 @@ class BaseStructure(GameElementBase):
         raise NotImplementedError
     
     def _updateElement(self, element):
-        self._elementMapping[element.shape] = element
-        self._elementMapping[element.node] = element
-        self._elementMapping[element.id] = element
+        self._elements.update(element)
+        self.invalidate()
     
     def getElement(self, obj):
-        return self._elementMapping[obj]
+        return self._elements.get(obj)
+    
+    def _addGraphNode(self, element):
+        self._graph.add_node(element.id)
+        self._clusterIndex.addNode(element.id, element.elementType)
+        self._reachabilityIndex.addNode(element.id)
+        if element in self._fixElements:
+            self._reachabilityIndex.setRoot(element.id)
+        self._pathTree.invalidate()
+        
+    def _removeGraphNode(self, element):
+        self._clusterIndex.removeNode(element.id)
+        self._graph.remove_node(element.id)
+        self._reachabilityIndex.removeNode(element.id)
+        self._pathTree.invalidate()
+        
+    def _addGraphEdge(self, idA, idB):
+        self._graph.add_edge(idA, idB)
+        self._clusterIndex.addEdge(idA, idB)
+        self._reachabilityIndex.addEdge(idA, idB)
+        self._pathTree.invalidate()
+        
+    def _addFixElement(self, element):
+        self._fixElements.add(element)
+        self._pathTree.addSource(element.id)
+        if element.id in self._graph:
+            self._reachabilityIndex.setRoot(element.id)
+            
+    def _removeFixElement(self, element):
+        self._fixElements.discard(element)
+        self._pathTree.removeSource(element.id)
+        self._reachabilityIndex.unsetRoot(element.id)
+        
+    def _addElementSlot(self, element):
+        self._slots.addCircle(element.shape, element.position, element.shape.radius)
+        
+    def _removeElementSlot(self, element):
+        self._slots.removeCircle(element.shape)
+        
+    def _getSortedFixElements(self):
+        return sorted(self._fixElements, key=lambda element: element.id)
        
     def startOverdrive(self, duration):
         self._overDriveCounter += duration
@@ -443,9 +530,7 @@ class BaseStructure(GameElementBase):
         return self._size
           
     def _initPhysic(self, position, angle):        
-        mass = pymunk.inf
-        moment = pymunk.moment_for_circle(mass, 0, 1)
-        self._body = physic.BaseBody(self, mass, moment)
+        self._body = physic.KinematicBody(self)
         self._space.add(self._body)                        
         
     def _createCircleShape(self, absPos, r=util.CRYSTAL_RADIUS):
@@ -485,6 +570,12 @@ class BaseStructure(GameElementBase):
         
         if self._veil is not None:
             self._veil.onTick()    
+        
+        self._edgeBatch.update()
+        self._shadowBatch.update()
+            
+        if self._canvasRenderer is not None:
+            self._canvasRenderer.renderIfDirty()
             
     @property
     def gameOverCallback(self):
@@ -500,10 +591,12 @@ class BaseStructure(GameElementBase):
             self.gameOverCallback = None
     
     def checkSanity(self):
-        return True
+        if not util.SANITY_CHECKS:
+            return True
+        return all(nodeId in self._elements for nodeId in self._graph)
   
     def updateNeigbourhoodVisualisation(self):
-        if __debug__:
+        if util.DEBUG_VISUALISATION:
             if not hasattr(self, "debugNodes"):
                 self.debugNodes = []
            
@@ -541,21 +634,29 @@ class BaseStructure(GameElementBase):
     def getGraphNeighbors(self, element):
         return [self.getElement(id) for id in self._graph.neighbors_iter(element.id)]
         
+    def _createElement(self, elementToCreate, color, relPos, rotation=0):
+        if color is None:
+            return elementToCreate(relPos, rotation, self, self._helpSystem)
+        else:
+            return elementToCreate(color, relPos, rotation, self, self._helpSystem)
+        
+    def _onElementAdded(self, element):
+        pass
+        
     def addElement(self, elementToCreate, color, relPos, rotation=0):
         assert(self.checkSanity())
         
-        if color is None:
-            element = elementToCreate(relPos, rotation, self, self._helpSystem)
-        else:
-            element = elementToCreate(color, relPos, rotation, self, self._helpSystem)
+        element = self._createElement(elementToCreate, color, relPos, rotation)
         self._updateElement(element)
         self._addElementShadow(element)
-        self._graph.add_node(element.id)
+        self._addElementSlot(element)
+        self._addGraphNode(element)
         
         assert(self.checkSanity())
         self.updateNeigbors(element)    
         assert(self.checkSanity())
         
+        self._onElementAdded(element)
         return element
         
     def _removeEdgeNodesForElement(self, element):
@@ -564,58 +665,46 @@ class BaseStructure(GameElementBase):
             if element.id in edge:
                 self._removeEdgeNodes(edge)    
                 
-    def _addEdgeNodes(self, edge):
+    def _addEdgeNodes(self, edge, animated=True):
         edge = tuple(sorted(edge))
         
         elementA = self.getElement(edge[0])
         elementB = self.getElement(edge[1])
         
-        shadowLine = avg.LineNode(parent=self._blackBackground)
-        shadowLine.color =  self._shadowColor
-        shadowLine.strokewidth = self._shadowWidth
-        shadowLine.opacity = 1
-        shadowLine.fillopacity = 1
-        shadowLine.pos1 = self.getOffscreenPosForElement(elementA.position)
-        shadowLine.pos2 = self.getOffscreenPosForElement(elementB.position)
-        self._shadowNodes[edge] = shadowLine
-        avg.LinearAnim(shadowLine, "opacity", 700, 0, 1).start()
+        self._shadowBatch.addLine(edge,
+                                  self.getShadowPosForElement(elementA.position),
+                                  self.getShadowPosForElement(elementB.position),
+                                  self._shadowWidth, 700 if animated else 0)
+        if animated:
+            CanvasPool.get().invalidateShadows(700)
+        else:
+            CanvasPool.get().invalidateShadows()
     
-        edgeLine = avg.LineNode(parent=self._graphVisRoot)
-        edgeLine.color = "F88017"
-        edgeLine.strokewidth = util.CRYSTAL_SIZE*0.1
-        edgeLine.opacity = 1
-        edgeLine.fillopacity = 1
-        edgeLine.pos1 = self.getOffscreenPosForElement(elementA.position)
-        edgeLine.pos2 = self.getOffscreenPosForElement(elementB.position)
-        avg.LinearAnim(edgeLine, "opacity", 5000, 0, 1).start()
-        self._edgeNodes[edge] = edgeLine
+        self._edgeBatch.addLine(edge,
+                                self.getOffscreenPosForElement(elementA.position),
+                                self.getOffscreenPosForElement(elementB.position),
+                                util.CRYSTAL_SIZE*0.1, 5000 if animated else 0)
+        if animated:
+            self.invalidate(5000)
+        else:
+            self.invalidate()
         
     def _removeEdgeNodes(self, edge):
         edge = tuple(sorted(edge))
-        if edge in self._edgeNodes:
-            edgeNode = self._edgeNodes[edge]
-            avg.LinearAnim(edgeNode, "opacity", 100, edgeNode.opacity, 0, False, None, lambda: edgeNode.unlink(True) ).start()
-            del self._edgeNodes[edge]
-        if edge in self._shadowNodes:
-            shadowNode = self._shadowNodes[edge]
-            avg.LinearAnim(shadowNode, "opacity", 700, shadowNode.opacity, 0, False, None, lambda:shadowNode.unlink(True) ).start()
-            self._shadowNodes[edge].unlink(True)
-            del self._shadowNodes[edge]
+        self._edgeBatch.remove(edge)
+        self._shadowBatch.remove(edge)
     
-    def _addElementShadow(self, element):
-        roundShadow = avg.CircleNode(parent=self._blackBackground,
-                                                pos = self.getOffscreenPosForElement(element.position),
-                                                r=self._shadowWidth/2,
-                                                fillcolor= self._shadowColor,
-                                                opacity=0,
-                                                fillopacity=1,
-                                                )
-        avg.LinearAnim(roundShadow, "fillopacity", 700, 0, 1).start()
-        self._shadowNodes[element.shape] = roundShadow
+    def _addElementShadow(self, element, animated=True):
+        self._shadowBatch.addCircle(element.shape,
+                                    self.getShadowPosForElement(element.position),
+                                    self._shadowWidth/2, 700 if animated else 0)
+        if animated:
+            CanvasPool.get().invalidateShadows(700)
+        else:
+            CanvasPool.get().invalidateShadows()
      
     def _removeElementShadow(self, element):
-        self._shadowNodes[element.shape].unlink(True)
-        del self._shadowNodes[element.shape]
+        self._shadowBatch.remove(element.shape)
         
     def onCrystalCollision(self, other, hitShape):
         try:
@@ -626,7 +715,11 @@ class BaseStructure(GameElementBase):
         element.onCollision(other)
     
     def getColorCount(self):
-        return collections.Counter([e.color for e in self._elementMapping.values()])
+        return self._elements.getColorCount()
+    
+    def _onColorCountChange(self, color, delta):
+        if self.crystalManager is not None:
+            self.crystalManager.changeColorCount(color, delta)
 
     def removeElement(self, element):
         assert(self.checkSanity())
@@ -637,29 +730,32 @@ class BaseStructure(GameElementBase):
         self._removeEdgeNodesForElement(element)
         self._removeElementShadow(element)
             
-        self._graph.remove_node(element.id)
+        self._removeGraphNode(element)
+        self._removeElementSlot(element)
             
         self._removeShape(element.shape)
         if element in self._fixElements:
-            self._fixElements.remove(element)
+            self._removeFixElement(element)
 #            avg.LinearAnim(element.node, "opacity",1000, 1 , 0, False, None, lambda:element.node.unlink(True)).start()
 #     
+        # The final tween value lands on the first frame past the render
+        # window, so finishing the tween invalidates the canvas once more.
         if self._fixElements:
-            targetPos = random.choice(list(self._fixElements)).node.pos
-            avg.LinearAnim(element.node, "pos",1000, element.node.pos , targetPos, False, None, lambda:element.node.unlink(True)).start()
+            targetPos = self._random.choice(self._getSortedFixElements()).node.pos
+            TweenEngine.get().tween(element.node, "pos", 1000, element.node.pos, targetPos,
+                                    self.invalidate, group=self, unlink=True)
         else:
-            avg.LinearAnim(element.node, "opacity",1000, 1 , 0, False, None, lambda:element.node.unlink(True)).start()
-
+            TweenEngine.get().tween(element.node, "opacity", 1000, 1, 0,
+                                    self.invalidate, group=self, unlink=True)
+        self.invalidate(1000)
          
-        del self._elementMapping[element.shape]
-        del self._elementMapping[element.node]
-        del self._elementMapping[element.id]
+        self._elements.remove(element)
         
         assert(self.checkSanity())
         
         self._checkDepleted()
         
-        if __debug__:
+        if util.DEBUG_VISUALISATION:
             self.updateNeigbourhoodVisualisation()
     
     
@@ -669,30 +765,27 @@ class BaseStructure(GameElementBase):
          
         if reset:
             self._removeEdgeNodesForElement(element)
-            self._graph.remove_node(element.id)
-            self._graph.add_node(element.id)
+            self._removeGraphNode(element)
+            self._addGraphNode(element)
             assert len(self._graph.neighbors(element.id)) == 0
         
         for shape in self.getPhysicNeigbors(element):   
             shapeId = self.getElement(shape).id
             if shapeId in self._graph:
-                self._graph.add_edge(element.id, shapeId)
+                self._addGraphEdge(element.id, shapeId)
                 self._addEdgeNodes((element.id, shapeId))
                    
         assert(self.checkSanity())
         
         
-        if __debug__:
+        if util.DEBUG_VISUALISATION:
             self.updateNeigbourhoodVisualisation()
                     
     def getPhysicNeigbors(self, element):
-        shape = element.shape
-        testBody = pymunk.Body()
-        testBody.position = self._body.local_to_world(shape.offset)
-        toTest = pymunk.Circle(testBody, self.neighbourhoodThreshold * util.CRYSTAL_SIZE/2)
-        result = self._space.shape_query(toTest)
-        result = filter(lambda s: s in self._shapes, result)   
-        return result
+        result = self._space.queryCircle(self._body.local_to_world(element.shape.offset),
+                                         self.neighbourhoodThreshold * util.CRYSTAL_SIZE/2,
+                                         (physic.StructureCollisionType,))
+        return [s for s in result if s in self._shapes]
 
             
     def randomizeNeighbors(self, element):
@@ -719,11 +812,11 @@ class BaseStructure(GameElementBase):
       
         if (elementA in self._fixElements) ^ (elementB in self._fixElements):
             if elementA in self._fixElements:
-                self._fixElements.remove(elementA)
-                self._fixElements.add(elementB)
+                self._addFixElement(elementB)
+                self._removeFixElement(elementA)
             elif elementB in self._fixElements:
-                self._fixElements.remove(elementB)
-                self._fixElements.add(elementA)
+                self._addFixElement(elementA)
+                self._removeFixElement(elementB)
             
         elementA.shape, elementB.shape = elementB.shape, elementA.shape
         
@@ -734,26 +827,13 @@ class BaseStructure(GameElementBase):
     
     def getSameExtendedNeighborhood(self, element):
         assert(self.checkSanity())
-        neighbourFilter = filter(lambda otherId: element.isSameType(self.getElement(otherId)), self._graph)
-        subGraph = self._graph.subgraph(neighbourFilter)
-        for graph in nx.connected_components(subGraph):
-            if element.id in graph:
-                assert(self.checkSanity())
-                return [self.getElement(i) for i in graph ]
-        else:
-            assert(self.checkSanity())
-            return []
+        return [self.getElement(i) for i in self._clusterIndex.getCluster(element.id)]
     
     def removeNotReachableElements(self):
-        toRemove = []
         removeCounter = 0
-        for graph in nx.connected_component_subgraphs(self._graph):
-            if all(element.id not in graph for element in self._fixElements):
-                toRemove.append(graph)
-                
-        for graph in toRemove:
-            for element in [self.getElement(i) for i in graph]:
-                self.removeElement(element)
+        for elementId in self._reachabilityIndex.getDetached():
+            if elementId in self._graph:
+                self.removeElement(self.getElement(elementId))
                 removeCounter +=1
                 
         return removeCounter
@@ -846,33 +926,29 @@ class BaseStructure(GameElementBase):
         elementChain = itertools.chain((newElement,), elementChain[1:])
         
         self._growLock = True
+        tweens = TweenEngine.get()
         for element, newPosition in zip(elementChain, newPositions): 
-            avg.LinearAnim(element.node, "pos", 1000, element.node.pos, newPosition).start()
+            tweens.tween(element.node, "pos", 1000, element.node.pos, newPosition,
+                         group=self._growGroup)
         
-        avg.LinearAnim(newElement.node, "opacity", 1000, 0, 1, False, None, self._resetGrowLock).start()
+        tweens.tween(newElement.node, "opacity", 1000, 0, 1, group=self._growGroup)
+        tweens.onGroupFinished(self._growGroup, self._resetGrowLock)
+        self.invalidate(1000)
         
         assert self.checkSanity()
         
     def _resetGrowLock(self):
         self._growLock = False
+        self.invalidate()
         
     def getRandomDestinationPath(self):
         newSpot, targetElement  = self.searchSpot() 
         if targetElement is None:
             return None, None
         assert isinstance(targetElement, StructureElement)
-        paths = []
-        for fixElement in self._fixElements:
-            try:
-                path = nx.shortest_path(self._graph,
-                                    fixElement.id,
-                                    targetElement.id)
-                paths.append(path)
-            except nx.exception.NetworkXNoPath:
-                pass  
-        if not paths:
+        shortestPath = self._pathTree.getPath(targetElement.id)
+        if shortestPath is None:
                 return None, None
-        shortestPath = min(paths, key=len)  
         return  newSpot, map(lambda x: self.getElement(x), shortestPath) 
          
     def growSimple(self):
@@ -882,22 +958,84 @@ class BaseStructure(GameElementBase):
             element = self.addElement(crystalType, color, relPos=newSpot)
             return element    
         
+    def growInBulk(self, count):
+        plan = self._planGrowth(count)
+        
+        elements = []
+        for planned in plan:
+            element = self._createElement(planned.elementType, planned.color, planned.position)
+            self._slots.rekeyCircle(planned, element.shape)
+            self._updateElement(element)
+            self._addElementShadow(element, animated=False)
+            self._addGraphNode(element)
+            elements.append(element)
+            
+        for planned, element in zip(plan, elements):
+            for key in self._slots.getKeysNear(planned.slot):
+                otherId = self.getElement(key).id
+                if otherId != element.id and not self._graph.has_edge(element.id, otherId):
+                    self._addGraphEdge(element.id, otherId)
+                    self._addEdgeNodes((element.id, otherId), animated=False)
+                    
+        for element in elements:
+            self._onElementAdded(element)
+        
+        assert(self.checkSanity())
+        if util.DEBUG_VISUALISATION:
+            self.updateNeigbourhoodVisualisation()
+        return elements
+    
+    def _planGrowth(self, count):
+        plan = []
+        fixOrigins = self._getSortedFixElements()
+        origins = [self.getElement(i) for i in sorted(self._graph)]
+        if not fixOrigins:
+            return plan
+        
+        while len(plan) < count:
+            randomOrigins = [self._random.choice(candidates)
+                             for candidates in (fixOrigins, origins)]
+            planned = self._planElementAround(randomOrigins)
+            if planned is None:
+                # Random picks can miss; only give up once no origin at all
+                # has a usable free slot left.
+                planned = self._planElementAround(fixOrigins + origins)
+            if planned is None:
+                break
+            plan.append(planned)
+            origins.append(planned)
+        return plan
+    
+    def _planElementAround(self, origins):
+        for origin in origins:
+            if isinstance(origin, StructureElement):
+                slots = self._slots.getFreeSlotsAround(origin.shape)
+            else:
+                slots = self._slots.getFreeSlotsAround(origin)
+            slotPositions = {self._slots.getSlotPosition(slot): slot for slot in slots}
+            spots = self._filterSpots(slotPositions.keys(), origin)
+            if spots:
+                spot = self._random.choice(spots)
+                color, crystalType = self.getElementTypeToGrow()
+                planned = BaseStructure.PlannedElement(slotPositions[spot], spot,
+                                                       color, crystalType)
+                self._slots.addCircle(planned, spot,
+                                      crystalType.shapeOverflowFactor*crystalType._size[0]/2)
+                return planned
+        return None
+        
     def getElementTypeToGrow(self):
         return self.crystalManager.getNextStructureElement(self)
             
     def removeElementsInArea(self, pos, radius):
         deletedelements = 0
         for shape in self._getShapesInCircle(pos, radius):
-            if shape in self._elementMapping:
+            if shape in self._elements:
                 deletedelements+= self.getElement(shape).delete()
         return deletedelements
     
     def _getShapesInCircle(self, pos, radius):
-        testBody = pymunk.Body()
-        testBody.position = pos
-        shapeToTest = pymunk.Circle(body=testBody, radius=radius)
-        intersections = self._space.shape_query(shapeToTest) 
-        return  intersections
+        return self._space.queryCircle(pos, radius, (physic.StructureCollisionType,))
          
     def searchSpot(self):
         if self._graph.nodes():
@@ -906,18 +1044,18 @@ class BaseStructure(GameElementBase):
             if not self._fixElements:
                 return None,None
             
-            fixelement = random.choice(list(self._fixElements))
+            fixelement = self._random.choice(self._getSortedFixElements())
             spots = self.checkForSpace(fixelement)
             spots =self._filterSpots(spots, fixelement)
             if spots:
-                return random.choice(spots), fixelement
+                return self._random.choice(spots), fixelement
         
-            node = random.choice(self._graph.nodes())
+            node = self._random.choice(sorted(self._graph))
             element = self.getElement(node)
             spots = self.checkForSpace(element)
             spots =self._filterSpots(spots, element)
             if spots:
-                return random.choice(spots), element
+                return self._random.choice(spots), element
     
         return None,None
     
@@ -925,33 +1063,7 @@ class BaseStructure(GameElementBase):
         return spots
             
     def checkForSpace(self, element):
-        radius = element.shape.radius + util.CRYSTAL_RADIUS + 1
-        availablePositions = []
-        stepsize = 360//4
-        maxNeigbors = 0
-        for alpha in range(0, 360, stepsize):
-            alpha += random.randint(0, stepsize-1)
-            #alpha+= random.randrange(stepsize)
-            angle = (2*math.pi)*(alpha/360.0)
-            vector = util.getVectotInDirection(angle, radius)
-            posToCheck = util.vectorAdd(self.toAbsPos(element.position), vector)
-            testBody = pymunk.Body()
-            testBody.position = posToCheck
-            shapeToTestInner = pymunk.Circle(body=testBody, radius=util.CRYSTAL_SIZE/2)
-            shapeToTestOuter = pymunk.Circle(body=testBody, radius=(util.CRYSTAL_SIZE/2)*self.neighbourhoodThreshold)
-            intersectionsInner = self._space.shape_query(shapeToTestInner) 
-            #dnode = avg.CircleNode(parent=self._root.getParent(), pos=posToCheck, r=util.CRYSTAL_SIZE/2,fillcolor="00FFFF", strokewidth=0)
-            if len(intersectionsInner) == 0 or (len(intersectionsInner) == 1 and element.shape in intersectionsInner) :
-                intersectionsOuter = self._space.shape_query(shapeToTestOuter)
-                neighborCount = len(intersectionsOuter)
-                #dnode.fillopacity=0.5
-                if neighborCount > maxNeigbors:
-                    maxNeigbors = neighborCount
-                    availablePositions = [self.toRelPos(posToCheck)]
-                elif neighborCount == maxNeigbors:
-                    availablePositions.append(self.toRelPos(posToCheck))
-
-        return availablePositions
+        return [self._slots.getSlotPosition(slot) for slot in self._slots.getFreeSlotsAround(element.shape)]
         
 class CenterNodeStructure(BaseStructure):
     
@@ -966,10 +1078,13 @@ class CenterNodeStructure(BaseStructure):
         BaseStructure.startOverdrive(self, duration)
         self._overDriveAnim = avg.ContinuousAnim(self.centerElement.node, "angle", self.centerElement.node.angle, 3)
         self._overDriveAnim.start()
+        self._canvasRenderer.continuous = True
  
     def _overdriveEnd(self):
         self._overDriveAnim.abort()
         self._overDriveAnim = None
+        self._canvasRenderer.continuous = False
+        self.invalidate()
     
     def _changeCrystalCount(self, value):
         self._crystalCount+= value
@@ -977,10 +1092,10 @@ class CenterNodeStructure(BaseStructure):
         if self._crystalCount <= self.monsterThreshold:
             newOpacity = (self._crystalCount/self.monsterThreshold)
             avg.LinearAnim(self._monsterNode,"opacity", 500, self._monsterNode.opacity, newOpacity).start()
+            self.invalidate(500)
         
-    def addElement(self, elementToCreate,color, relPos, rotation=0):
+    def _onElementAdded(self, element):
         self._changeCrystalCount(1)
-        return BaseStructure.addElement(self, elementToCreate, color,  relPos, rotation=rotation)
         
     def removeElement(self, element):
         if element is self.centerElement:
@@ -1010,8 +1125,9 @@ class CenterNodeStructure(BaseStructure):
         
         self.centerElement = element
         self._updateElement(element)
-        self._fixElements.add(element)
-        self._graph.add_node(element.id)
+        self._addElementSlot(element)
+        self._addGraphNode(element)
+        self._addFixElement(element)
         
     def _deleteLibavg(self):
         BaseStructure._deleteLibavg(self)
@@ -1033,6 +1149,7 @@ class CenterNodeStructure(BaseStructure):
         else:
             node = self._monsterNode
         node.unlink(False)
+        self.invalidate()
         self._rootParent.getParent().appendChild(node)
         node.pos=self.position
         maxSize = min(util.WINDOW_SIZE),min(util.WINDOW_SIZE)
@@ -1064,15 +1181,15 @@ class CeilingStructure(BaseStructure):
     def _initStructureCore(self):
         color, cls = self.crystalManager.getNextStructureElement(self)
         element = self.addElement(cls, color, (0,0))
-        self._fixElements.add(element)
+        self._addFixElement(element)
         
         for i in range(1,self._width//util.CRYSTAL_SIZE):
             color, cls = self.crystalManager.getNextStructureElement(self)
             element =self.addElement(cls, color, ( i*util.CRYSTAL_SIZE,0))
-            self._fixElements.add(element)
+            self._addFixElement(element)
             color, cls = self.crystalManager.getNextStructureElement(self)
             element = self.addElement(cls, color,(- i*util.CRYSTAL_SIZE,0))
-            self._fixElements.add(element)
+            self._addFixElement(element)
             
     def _filterSpots(self, spots, origin):
         yPos = origin.position[1] 
@@ -1093,11 +1210,10 @@ class AggressiveCenterNodeStructure(CenterNodeStructure):
         self._shootingElements = None
         return CenterNodeStructure.delete(self)
     
-    def addElement(self, elementToCreate,color, relPos, rotation=0):
-        element = CenterNodeStructure.addElement(self, elementToCreate, color, relPos, rotation=rotation)
+    def _onElementAdded(self, element):
+        CenterNodeStructure._onElementAdded(self, element)
         if isinstance(element, AggressionElement):
             self._shootingElements.append(element)
-        return element
     
     def removeElement(self, element):
         if isinstance(element, AggressionElement):
@@ -1106,7 +1222,7 @@ class AggressiveCenterNodeStructure(CenterNodeStructure):
         
     def getAggressionElement(self): 
         if self._shootingElements:
-            return random.choice(self._shootingElements)
+            return self._random.choice(self._shootingElements)
     
     def shoot(self):
         elementToShoot = self.getAggressionElement()
@@ -1115,7 +1231,7 @@ class AggressiveCenterNodeStructure(CenterNodeStructure):
         spots = self.checkForSpace(elementToShoot)
         if spots:
             from geneacrystal.gameElements import items
-            spot = self.toAbsPos(random.choice(spots))
+            spot = self.toAbsPos(self._random.choice(spots))
             c = items.BulletCrystal(self._space,
                                  self._root.getParent(),
                                  spot,
@@ -24,6 +24,7 @@ from geneacrystal.physic import DebugCrystalGameSpace, CrystalGameSpace, BorderC
     TeleportBorderCollisionType
 import itertools
 import math
+import random
 from geneacrystal.crystalManager import CrystalManager
 from geneacrystal.gameElements.structures import CenterNodeStructure, \
     AggressiveCenterNodeStructure, CeilingStructure
@@ -31,28 +32,49 @@ from geneacrystal.player import StaticQuadrantPlayer, StaticSlicePlayer
 from geneacrystal.helpSystem import HelpSystem, InfoManager
 from geneacrystal import themes
 from geneacrystal.gameElements import  playerBases
+from geneacrystal.tweenEngine import TweenEngine
 
 
 class ComeAndPlayGameNode(avg.DivNode):
 
     def __init__(self, settings, items, endCB, theme=themes.DefaultTheme,
-                 infos=dict(), *args, **kwargs):
+                 infos=dict(), seed=None, *args, **kwargs):
         """
         Creates a new object. 
         @param parent: the parent gameElement to append to.
+        @param seed: seed for the random numbers of this game, util.GAME_SEED
+                     is used if None and a new one is drawn and logged if
+                     that is None as well.
         """
         avg.DivNode.__init__(self, *args, **kwargs)
         
-        if __debug__:
-            self.space = DebugCrystalGameSpace()
+        if seed is None:
+            seed = util.GAME_SEED
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self._random = random.Random(seed)
+        avg.Logger.get().trace(avg.Logger.APP, "Game seed: {}".format(seed))
+        
+        physicSettings = dict(iterations=settings.get("iterations", 10),
+                              maxSubsteps=settings.get("max_substeps", 5),
+                              collisionSlop=settings.get("collision_slop", 0.1),
+                              adaptiveIterations=settings.get("adaptive_iterations", False),
+                              minIterations=settings.get("min_iterations", 3),
+                              frameBudget=settings.get("frame_budget", 1000/60.0) / 1000.0,
+                              idleSpeedThreshold=settings.get("idle_speed_threshold", 5),
+                              profiling=util.PHYSICS_PROFILING)
+        if util.DEBUG_VISUALISATION:
+            self.space = DebugCrystalGameSpace(**physicSettings)
         else:
-            self.space = CrystalGameSpace()
+            self.space = CrystalGameSpace(**physicSettings)
         self.__touchNodeMapping = {}
         self.__shieldNodeMapping = {}
         self._playerCannons = []
         self._endCB = endCB
         self._theme = theme   
-        self._generator = CrystalManager(items, settings.get("crystals", 3))#CrystalManager(items)
+        self._generator = CrystalManager(items, settings.get("crystals", 3),
+                                         randomGenerator=self._random)
         self.timers = []
         self.playerColors = ["999900", "990000", "009900", "000099"]
         self._highscore = "0"
@@ -70,8 +92,9 @@ class ComeAndPlayGameNode(avg.DivNode):
         self._helpSystem = HelpSystem(infos)   
    
         player = avg.Player.get()
-        tickTimer = player.setOnFrameHandler(lambda:self.space.step(1 / 150.0))
+        tickTimer = player.setOnFrameHandler(lambda:self.space.advance(player.getFrameDuration() / 1000.0))
         self.timers.append(tickTimer)
+        TweenEngine.get().start()
         
         player.getTestHelper().fakeKeyEvent(avg.KEYDOWN, 17, 116, "t", 116, 0)
         
@@ -171,6 +194,7 @@ class ComeAndPlayGameNode(avg.DivNode):
                                           parent=parent,
                                           helpSystem=self._helpSystem,
                                           crystalManager=self._generator,
+                                          randomGenerator=self._random,
                                           )
        
         gameElement.depletedCallback = lambda: self._winCB(showKeyboards=False)
@@ -343,6 +367,8 @@ class ComeAndPlayGameNode(avg.DivNode):
         for structure in self.structures:
             structure.delete()
         self.structures = []
+        
+        TweenEngine.get().stop()
             
             
 class CityDefenderGameNode(ComeAndPlayGameNode):
@@ -358,6 +384,7 @@ class CityDefenderGameNode(ComeAndPlayGameNode):
                                                     helpSystem=self._helpSystem,
                                                     crystalManager=self._generator,
                                                     shootFrequency = self._stuctureShootFrequency,
+                                                    randomGenerator=self._random,
                                                     )
         
         gameElement.depletedCallback = lambda : self._winCB(True)
@@ -510,6 +537,7 @@ class VersusModeNode(ComeAndPlayGameNode):
                                            crystalManager=self._generator,
                                            framesToGrowth= self._structureFramesToGrowth,
                                            startCrystals=self._structureStartSize,                                   
+                                           randomGenerator=self._random,
                                            )
                   
             gameElement.depletedCallback = self._makeStructureWinCB(player)
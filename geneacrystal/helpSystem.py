@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
 from libavg import avg
-from geneacrystal import themes
+from geneacrystal import themes, util
 import logging
 
 
@@ -65,7 +65,7 @@ class InfoBox(avg.DivNode):
         self._parent = self.getParent()
         self.opacity = 1
         self.sensitive = False
-        if __debug__:
+        if util.DEBUG_VISUALISATION:
             self.elementoutlinecolor = 'FFFFFF'
         self._formatText = '<span underline="single" size="larger" >{heading}</span><br/>{text}'
         theme.InfoBoxBackground(parent=self, size=self.size, opacity=0.5)
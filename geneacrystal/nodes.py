@@ -21,6 +21,7 @@ import pymunk
 from geneacrystal import util, physic
 from geneacrystal.alphaKeyboard import AlphaKeyboard
 from geneacrystal.highscore import Highscore
+import logging
 
 
 class ItemImageNode(avg.DivNode):
@@ -37,7 +38,7 @@ class ItemImageNode(avg.DivNode):
                                   )
         imageNode.pos = util.vectorMult(size, -0.5)
         self.image = imageNode
-        if __debug__:
+        if util.DEBUG_VISUALISATION:
             self.elementoutlinecolor = "FFFFFF"
         
     @property
@@ -79,8 +80,7 @@ class TouchPointNode(avg.CircleNode):
         self.shape.collision_type = physic.TouchPointCollisionType
         space.add(self._body, self.shape)
         
-        if __debug__:
-            print "Created ", self
+        logging.debug("Created %s", self)
         
     def __str__(self, *args, **kwargs):
         formatString = "TouchPointNode(pos={tp.pos}, owner={tp.owner})"
@@ -0,0 +1,45 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+from collections import MutableSet, OrderedDict
+
+
+class OrderedSet(MutableSet):
+    
+    def __init__(self, iterable=()):
+        self._items = OrderedDict()
+        for item in iterable:
+            self.add(item)
+            
+    def __contains__(self, item):
+        return item in self._items
+    
+    def __iter__(self):
+        return iter(self._items)
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def add(self, item):
+        self._items[item] = None
+        
+    def discard(self, item):
+        self._items.pop(item, None)
+        
+    def remove(self, item):
+        del self._items[item]
@@ -20,7 +20,10 @@ import pymunk
 import logging
 import libavg as avg
 import weakref
+import time
+import collections
 from geneacrystal import util
+from geneacrystal.orderedSet import OrderedSet
 
 
 CrystalCollisionType = 32
@@ -31,28 +34,137 @@ TouchPointCollisionType = 36
 CannonCollisionType = 37
 CityCollisionType = 38
 TeleportBorderCollisionType = 39
+LauncherSensorCollisionType = 40
+
+BODY_SYNC_EPSILON = 0.001
+
+COLLISION_HANDLER_NAMES = ("onWallCollision", "onCrystalCollision", "onCityCollision",
+                           "onTouchPointCollision", "onShieldCollision",
+                           "onCannonCollision", "onBorderCollision",
+                           "onStructureCollision", "onLauncherEnter",
+                           "onLauncherLeave")
+
+_collisionDispatchTables = dict()
+
+def getCollisionDispatchTable(cls):
+    try:
+        return _collisionDispatchTables[cls]
+    except KeyError:
+        table = dict((name, getattr(cls, name, None)) for name in COLLISION_HANDLER_NAMES)
+        _collisionDispatchTables[cls] = table
+        return table
 
 class CrystalGameSpace(pymunk.Space):
     
-    def __init__(self, iterations=10, endOfGameCallback=None):
+    def __init__(self, iterations=10, endOfGameCallback=None, stepSize=1/150.0,
+                 stepInterval=1/60.0, maxSubsteps=5, idleIterations=3,
+                 sleepTimeThreshold=0.5, profiling=False, profileLogInterval=5,
+                 collisionSlop=0.1, adaptiveIterations=False, minIterations=3,
+                 frameBudget=1/60.0, idleSpeedThreshold=5):
         pymunk.Space.__init__(self, iterations=iterations)
-        self.add_collision_handler(CrystalCollisionType,StructureCollisionType,post_solve=self.structureCollision)
-        self.add_collision_handler(StructureCollisionType, BorderCollisionType,begin=self.finalCollision)
-        self.add_collision_handler(CrystalCollisionType, BorderCollisionType,begin=self.crystalBorderCollision)
-        self.add_collision_handler(CannonCollisionType, CrystalCollisionType, begin=self.crystalCannonCollision)
-        self.add_collision_handler(TouchPointCollisionType, CrystalCollisionType, begin=self.touchpointCollision)
-        self.add_collision_handler(StructureCollisionType, CannonCollisionType, begin=self.cannonStructureCollision)
-        self.add_collision_handler(StructureCollisionType, CityCollisionType, begin=self.finalCollision)
-        self.add_collision_handler(CrystalCollisionType, CrystalCollisionType, begin=self.crystalCollision)
-        self.add_collision_handler(ShieldCollisionType, CrystalCollisionType, begin=self.shieldCollision)
-        self.add_collision_handler(TeleportBorderCollisionType, CrystalCollisionType, begin=self.crystalTeleportBorderCollision)
+        self.profiling = profiling
+        self.profileLogInterval = profileLogInterval
+        self._profile = collections.defaultdict(lambda: [0, 0.0])
+        self._lastProfileLog = time.time()
+        self.activeIterations = iterations
+        self.idleIterations = idleIterations
+        self.sleep_time_threshold = sleepTimeThreshold
+        self.idle_speed_threshold = idleSpeedThreshold
+        self.idleSpeedThreshold = idleSpeedThreshold
+        self.collision_slop = collisionSlop
+        self.adaptiveIterations = adaptiveIterations
+        self.minIterations = min(minIterations, iterations)
+        self.maxIterations = iterations
+        self.frameBudget = frameBudget
+        self._smoothedFrameTime = frameBudget
+        self._addCollisionHandler(CrystalCollisionType,StructureCollisionType,post_solve=self.structureCollision)
+        self._addCollisionHandler(StructureCollisionType, BorderCollisionType,begin=self.finalCollision)
+        self._addCollisionHandler(CrystalCollisionType, BorderCollisionType,begin=self.crystalBorderCollision)
+        self._addCollisionHandler(CannonCollisionType, CrystalCollisionType, begin=self.crystalCannonCollision)
+        self._addCollisionHandler(TouchPointCollisionType, CrystalCollisionType, begin=self.touchpointCollision)
+        self._addCollisionHandler(StructureCollisionType, CannonCollisionType, begin=self.cannonStructureCollision)
+        self._addCollisionHandler(StructureCollisionType, CityCollisionType, begin=self.finalCollision)
+        self._addCollisionHandler(CrystalCollisionType, CrystalCollisionType, begin=self.crystalCollision)
+        self._addCollisionHandler(ShieldCollisionType, CrystalCollisionType, begin=self.shieldCollision)
+        self._addCollisionHandler(TeleportBorderCollisionType, CrystalCollisionType, begin=self.crystalTeleportBorderCollision)
+        self._addCollisionHandler(LauncherSensorCollisionType, CrystalCollisionType,
+                                  begin=self.launcherSensorEnter,
+                                  separate=self.launcherSensorLeave)
        
-        self.add_collision_handler(StructureCollisionType, StructureCollisionType, begin=lambda s,a :False)
-        self.add_collision_handler(TouchPointCollisionType, StructureCollisionType, begin = lambda s,a:  False)
+        self._addCollisionHandler(StructureCollisionType, StructureCollisionType, begin=lambda s,a :False)
+        self._addCollisionHandler(TouchPointCollisionType, StructureCollisionType, begin = lambda s,a:  False)
        
         self.endOfGameCallback=endOfGameCallback
         self.inStep = False
         
+        self.stepSize = stepSize
+        self.stepInterval = stepInterval
+        self.maxSubsteps = maxSubsteps
+        self._accumulator = 0
+        self._syncedBodies = set()
+        self._kinematicBodies = set()
+        self._probeBody = pymunk.Body()
+        self._circleProbes = dict()
+        self._queryCache = dict()
+        self._pendingAdds = OrderedSet()
+        self._pendingRemoves = OrderedSet()
+        self._pendingUnlinks = OrderedSet()
+        self._flushScheduled = False
+        
+    def _addCollisionHandler(self, typeA, typeB, **handlers):
+        if self.profiling:
+            for phase, handler in handlers.items():
+                name = "{} {} {}-{}".format(phase, handler.__name__, typeA, typeB)
+                handlers[phase] = self._makeProfiledCallback(name, handler)
+        self.add_collision_handler(typeA, typeB, **handlers)
+        
+    def _makeProfiledCallback(self, name, callback):
+        def profiledCallback(*args):
+            start = time.time()
+            try:
+                return callback(*args)
+            finally:
+                self._recordProfile(name, time.time() - start)
+        return profiledCallback
+    
+    def _recordProfile(self, name, duration):
+        entry = self._profile[name]
+        entry[0] += 1
+        entry[1] += duration
+        
+    def getProfileSnapshot(self, reset=False):
+        snapshot = dict((name, tuple(entry)) for name, entry in self._profile.iteritems())
+        if reset:
+            self._profile.clear()
+        return snapshot
+    
+    def logProfile(self, reset=True):
+        snapshot = self.getProfileSnapshot(reset)
+        entries = sorted(snapshot.iteritems(), key=lambda item: item[1][1], reverse=True)
+        avg.Logger.get().trace(avg.Logger.PROFILE, "Physics: " + ", ".join(
+                "{}: {}x {:.2f}ms".format(name, count, duration * 1000)
+                for name, (count, duration) in entries))
+        self._lastProfileLog = time.time()
+        
+    def add(self, *objs):
+        self._queryCache.clear()
+        spaceObjs = []
+        for obj in objs:
+            if isinstance(obj, KinematicBody):
+                self._kinematicBodies.add(obj)
+            else:
+                spaceObjs.append(obj)
+            if isinstance(obj, BaseBody) and obj.needsSync:
+                self._syncedBodies.add(obj)
+        pymunk.Space.add(self, *spaceObjs)
+                
+    def remove(self, *objs):
+        self._queryCache.clear()
+        self._syncedBodies.difference_update(objs)
+        self._kinematicBodies.difference_update(objs)
+        pymunk.Space.remove(self, *[obj for obj in objs
+                                    if not isinstance(obj, KinematicBody)])
+        
     def crystalTeleportBorderCollision(self, space, arbiter):
         borderShape, crystalShape = self.getShapesByType(arbiter.shapes,
                                                          TeleportBorderCollisionType,
@@ -60,26 +172,39 @@ class CrystalGameSpace(pymunk.Space):
         crystalShape.body.onTeleportBorderCollision(None)         
         return False
     
+    def launcherSensorEnter(self, space, arbiter):
+        sensorBody, crystalBody = self.getShapeBodiesByType(arbiter.shapes,
+                                                            LauncherSensorCollisionType,
+                                                            CrystalCollisionType)
+        sensorBody.dispatchCollision("onLauncherEnter", crystalBody)
+        return True
+    
+    def launcherSensorLeave(self, space, arbiter):
+        sensorBody, crystalBody = self.getShapeBodiesByType(arbiter.shapes,
+                                                            LauncherSensorCollisionType,
+                                                            CrystalCollisionType)
+        sensorBody.dispatchCollision("onLauncherLeave", crystalBody)
+        
     def crystalBorderCollision(self, space, arbiter):
         borderShape, crystalShape = self.getShapesByType(arbiter.shapes,
                                                          BorderCollisionType,
                                                          CrystalCollisionType) 
            
-        crystalShape.body.onBorderCollision(None)          
+        crystalShape.body.dispatchCollision("onBorderCollision", None)          
         return True
         
     def touchpointCollision(self, space, arbiter):
         touchBody, crystalBody = self.getShapeBodiesByType(arbiter.shapes,
                                                          TouchPointCollisionType,
                                                          CrystalCollisionType) 
-        crystalBody.onTouchPointCollision(touchBody)           
+        crystalBody.dispatchCollision("onTouchPointCollision", touchBody)           
         return True
 
     def shieldCollision(self, space, arbiter):
         shieldBody, crystalBody = self.getShapeBodiesByType(arbiter.shapes,
                                                          ShieldCollisionType,
                                                          CrystalCollisionType) 
-        crystalBody.onShieldCollision(shieldBody)           
+        crystalBody.dispatchCollision("onShieldCollision", shieldBody)           
         return True
     
     def cityCollision(self, space, arbiter):
@@ -90,25 +215,24 @@ class CrystalGameSpace(pymunk.Space):
                                                          CityCollisionType,
                                                          CrystalCollisionType)
         
-        cityShape.body.onCrystalCollision(crystalShape.body, cityShape)
-        return crystalShape.body.onCityCollision(cityShape.body)
+        cityShape.body.dispatchCollision("onCrystalCollision", crystalShape.body, cityShape)
+        return crystalShape.body.dispatchCollision("onCityCollision", cityShape.body)
     
     def crystalCollision(self, space, arbiter):
         assert(len(arbiter.shapes) == 2) 
         assert(len(arbiter.contacts) == 1)
-        return bool(arbiter.shapes[0].body.onCrystalCollision(arbiter.shapes[1].body) and 
-                arbiter.shapes[1].body.onCrystalCollision(arbiter.shapes[0].body))
+        return bool(arbiter.shapes[0].body.dispatchCollision("onCrystalCollision", arbiter.shapes[1].body) and 
+                arbiter.shapes[1].body.dispatchCollision("onCrystalCollision", arbiter.shapes[0].body))
         
     def finalCollision(self, space, arbiter):
         
         for shape in arbiter.shapes:
             if shape.collision_type == StructureCollisionType:
-                shape.body.onWallCollision(None)
+                shape.body.dispatchCollision("onWallCollision", None)
         else:
             logging.warn("Bad End of Game Collision")
       
-        if __debug__:
-            print "---Game Over---"
+        logging.debug("Game over")
         return False
    
     def cannonStructureCollision(self,space,arbiter):
@@ -119,7 +243,7 @@ class CrystalGameSpace(pymunk.Space):
                                                             StructureCollisionType,
                                                             CannonCollisionType)
         cannonBody.onStructureCollision(structureBody)
-        structureBody.onWallCollision(cannonBody)
+        structureBody.dispatchCollision("onWallCollision", cannonBody)
         
         return False
         
@@ -136,8 +260,8 @@ class CrystalGameSpace(pymunk.Space):
         dX = crystalBody.position[0]- cannonBody.position[0]
         dY = crystalBody.position[1]- cannonBody.position[1]
         
-        crystalBody.onCannonCollision(cannonBody)
-        return cannonBody.onCrystalCollision(crystalBody, abs(dX),abs(dY))
+        crystalBody.dispatchCollision("onCannonCollision", cannonBody)
+        return cannonBody.dispatchCollision("onCrystalCollision", crystalBody, abs(dX),abs(dY))
         
     def getShapeBodiesByType(self, shapes, typeA, typeB): 
         shapeA, shapeB = self.getShapesByType(shapes, typeA, typeB) 
@@ -167,36 +291,132 @@ class CrystalGameSpace(pymunk.Space):
                                              arbiter.contacts[0].distance)
         incomming.position = util.vectorAdd(incomming.position, offset)
         incomming.update()
+        self._queryCache.clear()
         
-        structure.onCrystalCollision(incomming, structureShape)    
+        structure.dispatchCollision("onCrystalCollision", incomming, structureShape)    
         incomming.onStructureCollision(structure)     
         
         return False
     
-    def step(self, dt):
+    def advance(self, frameTime):
+        if self.adaptiveIterations:
+            self._adaptIterations(frameTime)
+        self._selectIterations()
+        self._accumulator += frameTime
+        substeps = 0
+        while self._accumulator >= self.stepInterval and substeps < self.maxSubsteps:
+            self.step(self.stepSize, False)
+            self._accumulator -= self.stepInterval
+            substeps += 1
+        if substeps == self.maxSubsteps:
+            self._accumulator = min(self._accumulator, self.stepInterval)
+        self.updateBodies(self._accumulator / self.stepInterval)
+        
+        if self.profiling and time.time() - self._lastProfileLog >= self.profileLogInterval:
+            self.logProfile()
+        
+    def _adaptIterations(self, frameTime):
+        self._smoothedFrameTime += (frameTime - self._smoothedFrameTime) * 0.1
+        if self._smoothedFrameTime > self.frameBudget * 1.2:
+            self.activeIterations = max(self.minIterations, self.activeIterations - 1)
+        elif self._smoothedFrameTime < self.frameBudget * 1.05:
+            self.activeIterations = min(self.maxIterations, self.activeIterations + 1)
+            
+    def _selectIterations(self):
+        # Scanned once per frame rather than per substep; a body starting to
+        # move mid-frame runs with idle iterations for at most one frame.
+        if self.isQuiet():
+            self.iterations = min(self.idleIterations, self.activeIterations)
+        else:
+            self.iterations = self.activeIterations
+            
+    def isQuiet(self):
+        # Crystals spinning on a launcher never fall asleep, so only linear
+        # motion above the idle threshold counts as activity.
+        threshold = self.idleSpeedThreshold ** 2
+        return not any(body.velocity.get_length_sqrd() > threshold
+                       for body in self.bodies if not body.is_sleeping)
+        
+    def step(self, dt, updateBodies=True):
+        for body in self._syncedBodies:
+            body.storeState()
+        for body in self._kinematicBodies:
+            body.integrate(dt)
+        self._queryCache.clear()
         self.inStep =True
-        pymunk.Space.step(self, dt)
+        if self.profiling:
+            start = time.time()
+            pymunk.Space.step(self, dt)
+            self._recordProfile("step", time.time() - start)
+        else:
+            pymunk.Space.step(self, dt)
         self.inStep = False
-        for body in self.bodies:
-            if isinstance(body, BaseBody): 
-                body.update()
+        self._queryCache.clear()
+        if updateBodies:
+            self.updateBodies()
+            
+    def updateBodies(self, alpha=1):
+        for body in self._syncedBodies:
+            body.update(alpha)
+        
+    def queryCircle(self, position, radius, collisionTypes=None):
+        position = tuple(position)
+        key = (position, radius, collisionTypes)
+        if key not in self._queryCache:
+            probe = self._circleProbes.get(radius)
+            if probe is None:
+                probe = pymunk.Circle(self._probeBody, radius)
+                self._circleProbes[radius] = probe
+            self._probeBody.position = position
+            shapes = self.shape_query(probe)
+            if collisionTypes is not None:
+                shapes = [s for s in shapes if s.collision_type in collisionTypes]
+            self._queryCache[key] = tuple(shapes)
+        return self._queryCache[key]
         
     def delayRemoveComplete(self, body):
-        self.add_post_step_callback(self.remove, body)
-        self.add_post_step_callback(self.remove, body.node.shape)
-        self.add_post_step_callback(lambda x : x.unlink(True), body.node)
+        self.delayRemove(body, body.node.shape)
+        self._pendingUnlinks.add(body.node)
     
     def delayRemove(self, *objs):
+        self._syncedBodies.difference_update(objs)
         for obj in objs: 
-            if obj in self._post_step_callbacks:
-                del self._post_step_callbacks[obj]
-                return
-            
-            self.add_post_step_callback(self.remove, obj)
+            if obj in self._pendingAdds:
+                self._pendingAdds.discard(obj)
+            else:
+                self._pendingRemoves.add(obj)
+        self._scheduleFlush()
         
     def delayedAdd(self, *objs):
         for obj in  objs:
-            self.add_post_step_callback(self.add, obj)
+            if obj in self._pendingRemoves:
+                self._pendingRemoves.discard(obj)
+            else:
+                self._pendingAdds.add(obj)
+        self._scheduleFlush()
+            
+    def _scheduleFlush(self):
+        if not self._flushScheduled:
+            self._flushScheduled = True
+            if self.profiling:
+                self.add_post_step_callback(
+                    self._makeProfiledCallback("post_step _flushPendingMutations",
+                                               self._flushPendingMutations), self)
+            else:
+                self.add_post_step_callback(self._flushPendingMutations, self)
+    
+    def _flushPendingMutations(self, key=None):
+        while self._pendingRemoves or self._pendingAdds or self._pendingUnlinks:
+            removes, self._pendingRemoves = self._pendingRemoves, OrderedSet()
+            adds, self._pendingAdds = self._pendingAdds, OrderedSet()
+            unlinks, self._pendingUnlinks = self._pendingUnlinks, OrderedSet()
+            if removes:
+                self.remove(*removes)
+            if adds:
+                self.add(*adds)
+            for node in unlinks:
+                node.unlink(True)
+        self._flushScheduled = False
     
     def getConstraintsForBody(self, body):
         result = filter(body.isConstraint, self.constraints )
@@ -210,8 +430,8 @@ class CrystalGameSpace(pymunk.Space):
 
     
 class DebugCrystalGameSpace(CrystalGameSpace):
-    def __init__(self, iterations=10):
-        CrystalGameSpace.__init__(self, iterations=iterations)
+    def __init__(self, *args, **kwargs):
+        CrystalGameSpace.__init__(self, *args, **kwargs)
         self.debugNodes = weakref.WeakKeyDictionary()
         self.debugRoot =  avg.Player.get().getRootNode()
     
@@ -251,13 +471,14 @@ class DebugCrystalGameSpace(CrystalGameSpace):
                 self.debugNodes[obj].unlink(True)
                 del self.debugNodes[obj]
         
-    def step(self, dt):
-        CrystalGameSpace.step(self, dt)
+    def step(self, dt, updateBodies=True):
+        CrystalGameSpace.step(self, dt, updateBodies)
         assert(len(self.debugNodes) < self.shapes + self.bodies)
         for item, node in self.debugNodes.items():
-            assert(item in self.shapes or item in self.bodies)
+            assert(item in self.shapes or item in self.bodies
+                   or item in self._kinematicBodies)
             
-        for body in self.bodies:
+        for body in self.bodies + list(self._kinematicBodies):
             node = self.debugNodes[body]
             node.pos = tuple(body.position)
         for shape in self.shapes:
@@ -282,41 +503,57 @@ class BaseBody(pymunk.Body):
     def __init__(self,gameElement, mass, moment):
         pymunk.Body.__init__(self, mass, moment)
         self._gameElement = gameElement       
-
-        self._makeCollisionHandler("onWallCollision")
-        self._makeCollisionHandler("onCrystalCollision")
-        self._makeCollisionHandler("onCityCollision")
-        self._makeCollisionHandler("onTouchPointCollision")
-        self._makeCollisionHandler("onShieldCollision")
-        self._makeCollisionHandler("onCannonCollision")
-        self._makeCollisionHandler("onBorderCollision")
+        self._previousPosition = None
+        self._previousAngle = None
+        self._renderedPosition = None
+        self._renderedAngle = None
+        self._collisionHandlers = getCollisionDispatchTable(gameElement.__class__)
         
     @property
     def gameElement(self):
         return self._gameElement
     
-    def update(self):
-        try:
-            self._gameElement._physicUpdate()
-        except AttributeError:
-            pass
-        
-    def _makeCollisionHandler(self, name):
-        if hasattr(self, name):
+    @property
+    def needsSync(self):
+        return hasattr(self._gameElement, "_physicUpdate")
+    
+    def storeState(self):
+        self._previousPosition = tuple(self.position)
+        self._previousAngle = self.angle
+        
+    def getInterpolatedState(self, alpha=1):
+        position, angle = tuple(self.position), self.angle
+        if alpha >= 1 or self._previousPosition is None:
+            return position, angle
+        (x, y), (previousX, previousY) = position, self._previousPosition
+        return ((previousX + (x - previousX)*alpha, previousY + (y - previousY)*alpha),
+                self._previousAngle + (angle - self._previousAngle)*alpha)
+    
+    def update(self, alpha=1):
+        if self._gameElement is None:
             return
         
-        def handler(otherBody, *args, **kwargs):
-            if not hasattr(self._gameElement, name):
-                return True
-            
-            fun = getattr(self._gameElement, name)
+        position, angle = self.getInterpolatedState(alpha)
+        if self._renderedPosition is not None:
+            (x, y), (renderedX, renderedY) = position, self._renderedPosition
+            if (abs(x - renderedX) <= BODY_SYNC_EPSILON and
+                abs(y - renderedY) <= BODY_SYNC_EPSILON and
+                abs(angle - self._renderedAngle) <= BODY_SYNC_EPSILON):
+                return
             
-            if otherBody is not None:
-                return fun(otherBody._gameElement, *args, **kwargs)
-            else:
-                return fun(None, *args, **kwargs)
-                
-        setattr(self, name, handler)    
+        self._gameElement._physicUpdate(position, angle)
+        self._renderedPosition = position
+        self._renderedAngle = angle
+        
+    def dispatchCollision(self, name, otherBody, *args):
+        handler = self._collisionHandlers[name]
+        if handler is None:
+            return True
+        
+        if otherBody is not None:
+            return handler(self._gameElement, otherBody._gameElement, *args)
+        else:
+            return handler(self._gameElement, None, *args)
         
     def onTeleportBorderCollision(self, other):
         
@@ -324,9 +561,11 @@ class BaseBody(pymunk.Body):
         
         if bodyX <= util.CRYSTAL_SIZE:
             self.position = util.WINDOW_SIZE[0] + util.CRYSTAL_SIZE, bodyY
+            self.storeState()
             
         elif bodyX >= util.WINDOW_SIZE[0]- util.CRYSTAL_SIZE:
             self.position = -util.CRYSTAL_SIZE, bodyY
+            self.storeState()
            
     def onStructureCollision(self, other):
         
@@ -336,13 +575,34 @@ class BaseBody(pymunk.Body):
             self._gameElement.delete()
             return False
         
-        if hasattr(self._gameElement, "onStructureCollision"):
-            return self._gameElement.onStructureCollision(other._gameElement)
+        return self.dispatchCollision("onStructureCollision", other)
         
     def delete(self):
         if self._gameElement is not None and self._gameElement.alive:
             self._gameElement.delete()
         self._gameElement = None
+        self._collisionHandlers = getCollisionDispatchTable(type(None))
+        
+        
+class StaticBody(BaseBody):
+    
+    def __init__(self, gameElement):
+        BaseBody.__init__(self, gameElement, None, None)
+        
+        
+class KinematicBody(BaseBody):
+    # Rogue body: kept out of pymunk's body list, moved by the space itself.
+    
+    def __init__(self, gameElement):
+        BaseBody.__init__(self, gameElement, pymunk.inf, pymunk.inf)
+        
+    def integrate(self, dt):
+        if self.angular_velocity:
+            self.angle += self.angular_velocity * dt
+        velocityX, velocityY = self.velocity
+        if velocityX or velocityY:
+            x, y = self.position
+            self.position = x + velocityX * dt, y + velocityY * dt
         
         
 class TouchPointBody(BaseBody):
@@ -21,6 +21,7 @@ import random
 import math
 import libavg
 from libavg import avg
+import logging
 
 
 class Player(object):
@@ -120,8 +121,7 @@ class StaticSlicePlayer(Player):
         sliceWidth = util.WINDOW_SIZE[0] / self.maxIndex
         mySliceLeftBorder = sliceWidth*self.index
         mySliceRightBorder = sliceWidth*(self.index+1)
-        if __debug__:
-            print mySliceLeftBorder, self.pos[0] , mySliceRightBorder
+        logging.debug("Slice %s < %s < %s", mySliceLeftBorder, self.pos[0], mySliceRightBorder)
         assert(mySliceLeftBorder < self.pos[0] <mySliceRightBorder)
         
         return SlicePlayerArea(mySliceLeftBorder, mySliceRightBorder, self.index)
@@ -154,10 +154,11 @@ class SlicePlayerArea(PlayerArea):
         pointOfOrigin =(eventX + dX, util.WINDOW_SIZE[1])
         pointOfOriginX = pointOfOrigin[0]
         
-        if __debug__:
+        if util.DEBUG_VISUALISATION:
             root = avg.Player.get().getRootNode()
             avg.CircleNode(parent=root, pos=pointOfOrigin, r=10,fillcolor="FF0000", fillopacity=1)
-            print "POO", pointOfOrigin, "BA", (baseAngle/(2*math.pi))*360, "BETA", beta
+        logging.debug("Point of origin %s, base angle %s, beta %s", pointOfOrigin,
+                      (baseAngle/(2*math.pi))*360, beta)
         
         return self.left < pointOfOriginX < self.right
         
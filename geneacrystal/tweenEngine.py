@@ -0,0 +1,182 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+from __future__ import division
+from libavg import avg
+import collections
+
+
+def _toValue(value):
+    if isinstance(value, (tuple, list)):
+        return avg.Point2D(value)
+    return value
+
+
+class TweenEngine(object):
+    
+    _instance = None
+    
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+    
+    def __init__(self):
+        self._nodes = []
+        self._attributes = []
+        self._startValues = []
+        self._endValues = []
+        self._deltas = []
+        self._startTimes = []
+        self._durations = []
+        self._groups = []
+        self._finishCallbacks = []
+        self._unlinkOnFinish = []
+        self._active = []
+        
+        self._index = dict()
+        self._groupCounts = collections.Counter()
+        self._groupCallbacks = collections.defaultdict(list)
+        self._frameHandler = None
+        
+    def start(self):
+        if self._frameHandler is None:
+            self._frameHandler = avg.Player.get().setOnFrameHandler(self.advance)
+            
+    def stop(self):
+        if self._frameHandler is not None:
+            avg.Player.get().clearInterval(self._frameHandler)
+            self._frameHandler = None
+        self.cancelAll(False)
+        
+    def tween(self, node, attribute, duration, start, end, onFinish=None,
+              group=None, unlink=False):
+        start = _toValue(start)
+        end = _toValue(end)
+        
+        key = (node, attribute)
+        replaced = self._index.get(key)
+        
+        setattr(node, attribute, start)
+        self._nodes.append(node)
+        self._attributes.append(attribute)
+        self._startValues.append(start)
+        self._endValues.append(end)
+        self._deltas.append(end - start)
+        self._startTimes.append(avg.Player.get().getFrameTime())
+        self._durations.append(duration)
+        self._groups.append(group)
+        self._finishCallbacks.append(onFinish)
+        self._unlinkOnFinish.append(unlink)
+        self._active.append(True)
+        
+        self._index[key] = len(self._nodes) - 1
+        if group is not None:
+            self._groupCounts[group] += 1
+            
+        # The replaced tween's callbacks run only once the new tween is
+        # registered, so they may safely start tweens on the same attribute.
+        if replaced is not None:
+            callbacks = []
+            self._deactivate(replaced, callbacks)
+            self._runCallbacks(callbacks)
+            
+    def onGroupFinished(self, group, callback):
+        if self.isRunning(group):
+            self._groupCallbacks[group].append(callback)
+        else:
+            callback()
+            
+    def isRunning(self, group):
+        return self._groupCounts[group] > 0
+    
+    def advance(self):
+        now = avg.Player.get().getFrameTime()
+        callbacks = []
+        for i, node in enumerate(self._nodes):
+            if not self._active[i]:
+                continue
+            duration = self._durations[i]
+            elapsed = now - self._startTimes[i]
+            if duration <= 0 or elapsed >= duration:
+                setattr(node, self._attributes[i], self._endValues[i])
+                self._deactivate(i, callbacks)
+            else:
+                setattr(node, self._attributes[i],
+                        self._startValues[i] + self._deltas[i] * (elapsed / duration))
+        
+        if len(self._index) < len(self._nodes):
+            self._compact()
+        self._runCallbacks(callbacks)
+        
+    def cancel(self, group, runCallbacks=True):
+        callbacks = [] if runCallbacks else None
+        for i, tweenGroup in enumerate(self._groups):
+            if self._active[i] and tweenGroup == group:
+                self._deactivate(i, callbacks)
+        self._compact()
+        if runCallbacks:
+            self._runCallbacks(callbacks)
+            
+    def cancelAll(self, runCallbacks=True):
+        callbacks = [] if runCallbacks else None
+        for i in xrange(len(self._nodes)):
+            if self._active[i]:
+                self._deactivate(i, callbacks)
+        self._compact()
+        if runCallbacks:
+            self._runCallbacks(callbacks)
+        
+    def _deactivate(self, i, callbacks):
+        node = self._nodes[i]
+        self._active[i] = False
+        key = (node, self._attributes[i])
+        if self._index.get(key) == i:
+            del self._index[key]
+        
+        if callbacks is not None:
+            if self._unlinkOnFinish[i]:
+                callbacks.append(lambda: node.unlink(True))
+            if self._finishCallbacks[i] is not None:
+                callbacks.append(self._finishCallbacks[i])
+            
+        group = self._groups[i]
+        if group is not None:
+            self._groupCounts[group] -= 1
+            if self._groupCounts[group] == 0:
+                del self._groupCounts[group]
+                groupCallbacks = self._groupCallbacks.pop(group, [])
+                if callbacks is not None:
+                    callbacks.extend(groupCallbacks)
+            
+    def _compact(self):
+        alive = [i for i, active in enumerate(self._active) if active]
+        if len(alive) == len(self._nodes):
+            return
+        for name in ("_nodes", "_attributes", "_startValues", "_endValues",
+                     "_deltas", "_startTimes", "_durations", "_groups",
+                     "_finishCallbacks", "_unlinkOnFinish", "_active"):
+            values = getattr(self, name)
+            setattr(self, name, [values[i] for i in alive])
+        self._index = dict(((node, attribute), i) for i, (node, attribute)
+                           in enumerate(zip(self._nodes, self._attributes)))
+        
+    def _runCallbacks(self, callbacks):
+        for callback in callbacks:
+            callback()
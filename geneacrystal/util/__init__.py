@@ -45,6 +45,11 @@ CAP_INACTIVITY_TIMEOUT = 50000
 
 MAX_HIGHSCORE_LENGTH = 10
 
+DEBUG_VISUALISATION = False
+SANITY_CHECKS = False
+PHYSICS_PROFILING = False
+GAME_SEED = None
+
 def transformVector(v):
     x,y = v
     return x,y
@@ -121,7 +121,7 @@ class ConfigReader(object):
             
     def get_game_info(self, game_mode, difficulty):
         
-        settings = {}
+        settings = self.get_physics_settings()
         items = {}
         
         for entry in self.config.childNodes:
@@ -150,6 +150,19 @@ class ConfigReader(object):
             
         return settings, items
     
+    def get_physics_settings(self):
+        
+        settings = {}
+        
+        for entry in self.config.childNodes:
+            for node in entry.childNodes:
+                if node.nodeName == "physics":
+                    
+                    for setting in node.getElementsByTagName("setting"):
+                        self.__read_setting_node(setting, settings)
+                        
+        return settings
+    
     def set_setting(self, game_mode, id, new_val):
         
         for entry in self.config.childNodes:
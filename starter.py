@@ -19,5 +19,17 @@
 import sys
 sys.path += ["./", "./media"]
 
+def getOptionValue(option):
+    if option in sys.argv:
+        index = sys.argv.index(option)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return None
+
+seed = getOptionValue("--seed")
+
 import geneacrystal
-geneacrystal.play()
\ No newline at end of file
+geneacrystal.play(debugVisualisation="--debug" in sys.argv,
+                  sanityChecks="--sanity-checks" in sys.argv,
+                  physicsProfiling="--profile-physics" in sys.argv,
+                  seed=None if seed is None else int(seed))
\ No newline at end of file
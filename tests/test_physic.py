@@ -0,0 +1,128 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+import pymunk
+from geneacrystal import physic, util
+
+
+def makeStructureBody(space, position=(640, 400)):
+    body = physic.KinematicBody(None)
+    body.position = position
+    body.angular_velocity = 0.05
+    space.add(body)
+    for offset in ((0, 0), (util.CRYSTAL_SIZE, 0)):
+        circle = pymunk.Circle(body, util.CRYSTAL_RADIUS, offset)
+        circle.collision_type = physic.StructureCollisionType
+        space.add(circle)
+    return body
+
+
+class DebugSpaceTest(unittest.TestCase):
+    
+    def testStepWithStructure(self):
+        space = physic.DebugCrystalGameSpace()
+        body = makeStructureBody(space)
+        for _ in range(3):
+            space.advance(space.stepInterval)
+        self.assertEqual(space.debugNodes[body].pos, tuple(body.position))
+        self.assertNotEqual(body.angle, 0)
+        space.delete()
+        
+        
+class IterationSelectionTest(unittest.TestCase):
+    
+    def _addCrystal(self, space, velocity=(0, 0), angularVelocity=0):
+        body = pymunk.Body(util.CRYSTAL_MASS, 100)
+        body.position = (200, 200)
+        body.velocity = velocity
+        body.angular_velocity = angularVelocity
+        circle = pymunk.Circle(body, util.CRYSTAL_RADIUS)
+        circle.collision_type = physic.CrystalCollisionType
+        space.add(body, circle)
+        return body
+    
+    def testIdleWithSpinningLauncherCrystal(self):
+        space = physic.CrystalGameSpace(iterations=10, idleIterations=3)
+        self._addCrystal(space, angularVelocity=2)
+        space.advance(space.stepInterval)
+        self.assertTrue(space.isQuiet())
+        self.assertEqual(space.iterations, 3)
+        
+    def testActiveWithFlyingCrystal(self):
+        space = physic.CrystalGameSpace(iterations=10, idleIterations=3)
+        self._addCrystal(space, velocity=(300, 0))
+        space.advance(space.stepInterval)
+        self.assertEqual(space.iterations, 10)
+        
+        
+class LauncherStub(object):
+    
+    def __init__(self):
+        self.items = set()
+        self.leaveCount = 0
+        
+    def onLauncherEnter(self, other):
+        self.items.add(other)
+        return True
+    
+    def onLauncherLeave(self, other):
+        self.items.discard(other)
+        self.leaveCount += 1
+        return True
+    
+    
+class CrystalStub(object):
+    
+    alive = True
+    
+    def delete(self):
+        self.alive = False
+        
+        
+class LauncherSensorTest(unittest.TestCase):
+    
+    def testRemovedCrystalLeavesLauncher(self):
+        space = physic.CrystalGameSpace()
+        launcher = LauncherStub()
+        sensorBody = physic.StaticBody(launcher)
+        sensorBody.position = (200, 200)
+        sensor = pymunk.Circle(sensorBody, util.CRYSTAL_SIZE)
+        sensor.sensor = True
+        sensor.collision_type = physic.LauncherSensorCollisionType
+        space.add(sensor)
+        
+        crystal = CrystalStub()
+        crystalBody = physic.BaseBody(crystal, util.CRYSTAL_MASS, 100)
+        crystalBody.position = (200, 200)
+        crystalShape = pymunk.Circle(crystalBody, util.CRYSTAL_RADIUS)
+        crystalShape.collision_type = physic.CrystalCollisionType
+        space.add(crystalBody, crystalShape)
+        
+        space.advance(space.stepInterval)
+        self.assertEqual(launcher.items, set([crystal]))
+        
+        crystalBody.delete()
+        space.delayRemove(crystalBody, crystalShape)
+        space.advance(space.stepInterval)
+        self.assertEqual(launcher.leaveCount, 1)
+        self.assertFalse(crystal.alive)
+
+
+if __name__ == "__main__":
+    unittest.main()
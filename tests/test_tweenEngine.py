@@ -0,0 +1,127 @@
+# GeneaCrystal Copyright (C) 2012-2013
+#    Christian Jaeckel, <christian.doe@gmail.com>
+#    Frederic Kerber, <fkerber@gmail.com>
+#    Pascal Lessel, <maverickthe6@gmail.com>
+#    Michael Mauderer, <mail@michaelmauderer.de>
+#
+# GeneaCrystal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GeneaCrystal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GeneaCrystal. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from libavg import avg
+from geneacrystal.tweenEngine import TweenEngine
+from geneacrystal.canvasPool import OnDemandRenderer
+
+
+class FakePlayer(object):
+    
+    def __init__(self):
+        self.frameTime = 0
+        
+    def getFrameTime(self):
+        return self.frameTime
+    
+    def setOnFrameHandler(self, handler):
+        return 1
+    
+    def clearInterval(self, handlerId):
+        return True
+    
+    
+class Target(object):
+    
+    opacity = 0
+    linked = True
+    
+    def unlink(self, kill=False):
+        self.linked = False
+        
+        
+class RecordingCanvas(object):
+    
+    def __init__(self, target):
+        self.target = target
+        self.renders = []
+        
+    def render(self):
+        self.renders.append((self.target.opacity, self.target.linked))
+    
+    
+class PlayerTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.player = FakePlayer()
+        self._playerGet = avg.Player.get
+        avg.Player.get = staticmethod(lambda: self.player)
+        
+    def tearDown(self):
+        avg.Player.get = self._playerGet
+        
+        
+class TweenReplacementTest(PlayerTestCase):
+    
+    def testCallbackOfReplacedTweenRestartsAttribute(self):
+        engine = TweenEngine()
+        target = Target()
+        
+        def chain():
+            engine.tween(target, "opacity", 100, 0.5, 0)
+        
+        engine.tween(target, "opacity", 100, 0, 1, chain)
+        engine.tween(target, "opacity", 100, 1, 0.5)
+        
+        active = [i for i, isActive in enumerate(engine._active) if isActive]
+        self.assertEqual(len(active), 1)
+        self.assertEqual(engine._index[(target, "opacity")], active[0])
+        self.assertEqual(engine._startValues[active[0]], 0.5)
+        
+        self.player.frameTime = 100
+        engine.advance()
+        self.assertEqual(target.opacity, 0)
+        self.assertEqual(engine._nodes, [])
+        
+    def testReplacementKeepsGroupRunning(self):
+        engine = TweenEngine()
+        target = Target()
+        finished = []
+        engine.tween(target, "opacity", 100, 0, 1, group="grow")
+        engine.onGroupFinished("grow", lambda: finished.append(True))
+        engine.tween(target, "opacity", 100, 1, 0, group="grow")
+        self.assertEqual(finished, [])
+        
+        self.player.frameTime = 100
+        engine.advance()
+        self.assertEqual(finished, [True])
+        
+        
+class RenderAfterTweenTest(PlayerTestCase):
+    
+    def testRemovalTweenEndIsRendered(self):
+        engine = TweenEngine()
+        target = Target()
+        canvas = RecordingCanvas(target)
+        renderer = OnDemandRenderer(canvas)
+        
+        engine.tween(target, "opacity", 1000, 1, 0, renderer.invalidate, unlink=True)
+        renderer.invalidate(1000)
+        # Structures may render before the engine advances in a frame, so
+        # the final value only becomes visible on the following frame.
+        for frame in range(70):
+            self.player.frameTime = frame * 16
+            renderer.renderIfDirty()
+            engine.advance()
+        
+        self.assertEqual(canvas.renders[-1], (0, False))
+
+
+if __name__ == "__main__":
+    unittest.main()